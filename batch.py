@@ -0,0 +1,142 @@
+"""
+Offline analysis of saved Hap positions, no GUI needed.
+
+Positions are read one per line, either JSON
+    {"id": "a1", "N": 2, "M": 5, "board": ".0.../.....", "player": 1}
+or text
+    2 5 .0.../..... 1
+where the board is N*M characters ('.' empty, '0' poisoned, '1'/'2' coloured),
+'/' between rows is optional and the player to move defaults to 1.
+Results are written as JSON lines, in input order:
+
+    python batch.py positions.jsonl -o results.jsonl --workers 4 --time 2 --store cache
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import Context, Game, MAX_DEPTH, MOVE_POLICIES, iterative_deepening, policy_for_time
+from store import StoreFolder
+
+CELLS = {'.': Game.emptyCell, '0': Game.poisonedCell, '1': Game.player1, '2': Game.player2}
+SYMBOLS = {value: symbol for symbol, value in CELLS.items()}
+
+
+def parsePosition(line):
+    if line.startswith('{'):
+        position = json.loads(line)
+    else:
+        fields = line.split()
+        position = {"N": int(fields[0]), "M": int(fields[1]), "board": fields[2]}
+        if len(fields) > 3:
+            position["player"] = int(fields[3])
+    return checkPosition(position)
+
+
+def checkPosition(position):
+    # adds the cellTable of the board, position is a dict like the JSON lines
+    board = position["board"].replace('/', '')
+    if len(board) != position["N"] * position["M"]:
+        raise ValueError(f"board has {len(board)} cells, expected {position['N'] * position['M']}")
+    position["cellTable"] = [CELLS[cell] for cell in board]
+    return position
+
+
+def boardText(dimensions, cellTable):
+    return '/'.join(''.join(SYMBOLS[cell] for cell in cellTable[lin * dimensions[1]:(lin + 1) * dimensions[1]])
+                    for lin in range(dimensions[0]))
+
+
+def readPositions(file):
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def analyse(task):
+    index, line, timeLimit, maxDepth, storeDir, policy = task
+    result = {"index": index}
+    try:
+        position = parsePosition(line)
+    except (ValueError, KeyError) as error:
+        result["error"] = str(error)
+        return result
+    if "id" in position:
+        result["id"] = position["id"]
+
+    tBefore = time.perf_counter()
+    try:
+        dimensions = (position["N"], position["M"])
+        context = Context(None, dimensions, position["cellTable"].count(Game.poisonedCell))
+        context.setMovePolicy(policy_for_time(timeLimit) if policy == "auto" else policy)
+        game = Game(context, position["cellTable"])
+        game.currentPlayer = position.get("player", Game.player1)
+        context.setPlayer(Game.otherPlayer(game.currentPlayer))
+
+        winner = game.isFinal()
+        if winner:
+            result.update(final=winner, move=None, score=None, depth=0, nodes=0)
+        else:
+            # the store files are opened for this position only, a worker keeps nothing between tasks
+            context.setStore(None if storeDir is None else StoreFolder(storeDir))
+            try:
+                state, depth, stats = iterative_deepening(game, maxDepth, timeLimit)
+            finally:
+                if context.stores is not None:
+                    context.stores.close()
+            move = state.move.game.lastMove if state is not None and state.move is not None else None
+            result.update(move=move, score=None if state is None else state.score, depth=depth, nodes=stats.nodes)
+    except Exception as error:  # one bad position must not stop the stream
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+    result["time"] = round(time.perf_counter() - tBefore, 4)
+    return result
+
+
+def analyseStream(lines, workers=None, timeLimit=1.0, maxDepth=MAX_DEPTH, storeDir=None, policy="all"):
+    # at most a few positions per worker are in flight, so memory does not grow with the file
+    workers = workers or os.cpu_count() or 1
+    with Pool(workers) as pool:
+        window = 4 * workers
+        pending = deque()
+        for index, line in enumerate(lines):
+            pending.append(pool.apply_async(analyse, ((index, line, timeLimit, maxDepth, storeDir, policy),)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse Hap positions from a file")
+    parser.add_argument("input", help="JSONL or text file with one position per line, - for stdin")
+    parser.add_argument("-o", "--output", help="result file, stdout if missing")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--time", type=float, default=1.0,
+                        help="seconds per position, a soft limit: the depth 1 search always completes")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="maximum search depth")
+    parser.add_argument("--store", default=None, help="folder of the on-disk position stores, shared between runs")
+    parser.add_argument("--policy", default="all", choices=MOVE_POLICIES + ("auto",),
+                        help="reduced move list, auto picks one for the time budget")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    for result in analyseStream(readPositions(source), args.workers, args.time, args.depth, args.store, args.policy):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+    if source is not sys.stdin:
+        source.close()
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
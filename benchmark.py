@@ -0,0 +1,299 @@
+"""
+Benchmark for the Hap engine on a fixed, seeded set of positions.
+
+    python benchmark.py [depth] [positions]
+"""
+import random
+import sys
+import tempfile
+import time
+
+from layouts import iterLayouts
+from main import DIFFICULTY, MOVE_POLICIES, Context, Game, State, alpha_beta, iterative_deepening, multi_pv, search_difficulty
+from search import LMR, NULL_MOVE, SearchStats
+from regions import SEARCHED
+from store import StoreFolder
+
+DIMENSIONS = (5, 6)
+POISONED = 3
+SEED = 2023
+
+
+def benchmarkPositions(count=20, dimensions=DIMENSIONS, poisoned=POISONED, seed=SEED):
+    # the positions share one context: the settings of a comparison and the evaluation cache
+    rng = random.Random(seed)
+    context = Context(None, dimensions, poisoned)
+    layouts = iterLayouts(dimensions, poisoned, seed)
+    positions = []
+    while len(positions) < count:
+        cellTable = [Game.emptyCell] * dimensions[0] * dimensions[1]
+        for index in next(layouts):
+            cellTable[index] = Game.poisonedCell
+        game = Game(context, cellTable)
+        game.currentPlayer = Game.player1
+
+        # a few random rectangles to get away from the opening
+        for ply in range(rng.randint(2, 6)):
+            rects = list(game.rectangles(game.currentPlayer))
+            if not rects:
+                break
+            game = game.applyMove(rng.choice(rects), game.currentPlayer)
+            if game.isFinal():
+                break
+        if not game.isFinal():
+            positions.append(game)
+    return positions
+
+
+def search(game, depth):
+    game.context.setPlayer(Game.otherPlayer(game.currentPlayer))
+    tBefore = time.perf_counter()
+    state = alpha_beta(float("-inf"), float("inf"), State(game, game.currentPlayer, depth))
+    return state.move.game.lastMove, state.score, time.perf_counter() - tBefore
+
+
+def compareSelective(positions, depth):
+    context = positions[0].context
+    different = 0
+    timeFull = timeSelective = 0
+    for game in positions:
+        context.setSelective(False)
+        moveFull, scoreFull, t = search(game, depth)
+        timeFull += t
+        context.setSelective(True)
+        moveSelective, scoreSelective, t = search(game, depth)
+        timeSelective += t
+        context.setSelective(False)
+
+        if moveFull != moveSelective:
+            different += 1
+            print(f"  full {moveFull} ({scoreFull}) vs selective {moveSelective} ({scoreSelective})")
+
+    print(f"Selective search: full move list chose differently in {different}/{len(positions)} positions")
+    print(f"Time full {timeFull:.2f}s, selective {timeSelective:.2f}s")
+    print(f"Evaluation cache: {context.evalCache.stats()}")
+    return different
+
+
+def compareSuicidal(positions, depth):
+    # branching factor with and without the suicidal rectangles, and the cost of the search
+    context = positions[0].context
+    movesAll = movesSafe = 0
+    timeAll = timeSafe = 0
+    different = 0
+    for game in positions:
+        rects = list(game.rectangles(game.currentPlayer))
+        movesAll += len(rects)
+        movesSafe += len(game.withoutSuicidal(rects))
+
+        context.dropSuicidal = False
+        moveAll, scoreAll, t = search(game, depth)
+        timeAll += t
+        context.dropSuicidal = True
+        moveSafe, scoreSafe, t = search(game, depth)
+        timeSafe += t
+        different += scoreAll != scoreSafe
+
+    print(f"Suicidal rectangles: {movesAll / len(positions):.1f} -> {movesSafe / len(positions):.1f} moves per position,"
+          f" different scores in {different}/{len(positions)}")
+    print(f"Time all moves {timeAll:.2f}s, without suicidal {timeSafe:.2f}s")
+    return different
+
+
+def comparePolicies(positions, depth):
+    # nodes of every reduced move list against how often it still picks the full width move,
+    # or a move the full width search scores just as high
+    context = positions[0].context
+
+    def searchWith(policy, state):
+        context.setMovePolicy(policy)
+        stats = SearchStats()
+        tBefore = time.perf_counter()
+        state = alpha_beta(float("-inf"), float("inf"), state, stats)
+        return state, stats.nodes, time.perf_counter() - tBefore
+
+    full = []
+    for game in positions:
+        context.setPlayer(Game.otherPlayer(game.currentPlayer))
+        full.append(searchWith("all", State(game, game.currentPlayer, depth)))
+    fullNodes = sum(nodes for state, nodes, t in full)
+    print(f"Move policy all: {fullNodes} nodes, {sum(t for state, nodes, t in full):.2f}s")
+
+    for policy in MOVE_POLICIES[1:]:
+        nodes = same = good = 0
+        elapsed = 0
+        for game, (fullState, n, t) in zip(positions, full):
+            context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            state, n, t = searchWith(policy, State(game, game.currentPlayer, depth))
+            nodes += n
+            elapsed += t
+            same += state.move.game.lastMove == fullState.move.game.lastMove
+            child = State(state.move.game, Game.otherPlayer(game.currentPlayer), depth - 1)
+            good += searchWith("all", child)[0].score == fullState.score
+        print(f"Move policy {policy}: {nodes / fullNodes:.0%} of the nodes, {elapsed:.2f}s,"
+              f" same move {same}/{len(positions)}, as good {good}/{len(positions)}")
+    context.setMovePolicy("all")
+
+
+def compareMultiPV(positions, depth, count=3):
+    # hints: the count best moves against only the best one, both deepened the same way up to depth
+    results = {}
+    for lines in (1, count):
+        nodes, elapsed, scores = 0, 0, []
+        for game in positions:
+            game.context.evalCache.clear()
+            tBefore = time.perf_counter()
+            found, reached, stats = multi_pv(game, depth, lines)
+            elapsed += time.perf_counter() - tBefore
+            nodes += stats.nodes
+            scores.append(found[0][0] if found else None)
+        results[lines] = nodes, elapsed, scores
+    (nodesOne, timeOne, scoresOne), (nodesMany, timeMany, scoresMany) = results[1], results[count]
+    same = sum(a == b for a, b in zip(scoresOne, scoresMany))
+    print(f"Multi-PV {count} lines: {nodesMany / max(nodesOne, 1):.2f}x the nodes, {timeMany / max(timeOne, 1e-9):.2f}x the time"
+          f" of one line ({timeMany / len(positions) * 1000:.1f}ms per position), same best score {same}/{len(positions)}")
+
+
+def compareReductions(positions, depth):
+    # nodes to reach depth with late move reductions and null moves, and how often the move
+    # is still as good as the one of the full search (scored by the full search). Both only act
+    # below the root (it has no beta to fail high against) from their smallest depth on, so the
+    # search goes at least one ply deeper than that
+    depth = max(depth, NULL_MOVE["depth"] + 1, LMR["depth"] + 1)
+    configs = (("full", None, None), ("lmr", LMR, None),
+               ("null move", None, NULL_MOVE), ("null move, not verified", None, dict(NULL_MOVE, verify=False)),
+               ("lmr + null move", LMR, NULL_MOVE))
+    context = positions[0].context
+    full = None
+    for name, lmr, nullMove in configs:
+        context.setReductions(lmr, nullMove)
+        nodes, elapsed, results, researches, nullCutoffs = 0, 0, [], 0, 0
+        for game in positions:
+            context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            context.evalCache.clear()
+            tBefore = time.perf_counter()
+            state, reached, stats = iterative_deepening(game, depth)
+            elapsed += time.perf_counter() - tBefore
+            nodes += stats.nodes
+            researches += stats.researches
+            nullCutoffs += stats.nullCutoffs
+            results.append(state)
+        context.setReductions()
+        if full is None:
+            full, fullNodes = results, nodes
+            print(f"Reductions {name} (depth {depth}): {nodes} nodes, {elapsed:.2f}s")
+            continue
+        same = good = 0
+        for game, fullState, state in zip(positions, full, results):
+            same += state.score == fullState.score
+            context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            child = State(state.move.game, Game.otherPlayer(game.currentPlayer), depth - 1)
+            good += alpha_beta(float("-inf"), float("inf"), child).score == fullState.score
+        print(f"Reductions {name}: {nodes / fullNodes:.0%} of the nodes, {elapsed:.2f}s, {researches} re-searches,"
+              f" {nullCutoffs} null-move cutoffs, same score {same}/{len(positions)}, as good a move {good}/{len(positions)}")
+
+
+def endgamePositions(count=10, dimensions=DIMENSIONS, poisoned=POISONED, seed=SEED, freeRegions=2):
+    # random games stopped once freeRegions regions are summed up instead of searched (regions.py),
+    # the endgames the split is for
+    rng = random.Random(seed)
+    context = Context(None, dimensions, poisoned)
+    layouts = iterLayouts(dimensions, poisoned, seed)
+    positions = []
+    while len(positions) < count:
+        cellTable = [Game.emptyCell] * dimensions[0] * dimensions[1]
+        for index in next(layouts):
+            cellTable[index] = Game.poisonedCell
+        game = Game(context, cellTable)
+        while not game.isFinal():
+            rects = list(game.rectangles(game.currentPlayer))
+            game = game.applyMove(rng.choice(game.withoutSuicidal(rects) or rects), game.currentPlayer)
+            if not game.isFinal() and sum(kind != SEARCHED for kind in game.getRegions().kinds) >= freeRegions:
+                positions.append(game)
+                break
+    return positions
+
+
+def compareRegions(positions, depth):
+    # nodes and time with the independent regions summed up, and whether the positions both
+    # searches solved have the same winner
+    context = positions[0].context
+    results = {}
+    for splitRegions in (False, True):
+        context.setRegions(splitRegions)
+        nodes, elapsed, scores = 0, 0, []
+        for game in positions:
+            context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            context.evalCache.clear()
+            stats = SearchStats()
+            tBefore = time.perf_counter()
+            scores.append(alpha_beta(float("-inf"), float("inf"), State(game, game.currentPlayer, depth), stats).score)
+            elapsed += time.perf_counter() - tBefore
+            nodes += stats.nodes
+        results[splitRegions] = nodes, elapsed, scores
+    context.setRegions(False)
+
+    maxScore = context.maxScore
+    solved = same = 0
+    for full, split in zip(results[False][2], results[True][2]):
+        if abs(full) >= maxScore and abs(split) >= maxScore:
+            solved += 1
+            same += (full > 0) == (split > 0)
+    (fullNodes, fullTime, _), (nodes, elapsed, _) = results[False], results[True]
+    print(f"Regions ({len(positions)} endgames): {fullNodes} -> {nodes} nodes ({fullNodes / max(nodes, 1):.1f}x fewer),"
+          f" {fullTime:.2f}s -> {elapsed:.2f}s ({fullTime / max(elapsed, 1e-9):.1f}x faster),"
+          f" same winner {same}/{solved} solved")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[round(p * (len(values) - 1))]
+
+
+def difficultyLatency(positions):
+    for difficulty in sorted(DIFFICULTY):
+        latencies, nodes = [], 0
+        for game in positions:
+            game.context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            tBefore = time.perf_counter()
+            state, depth, stats = search_difficulty(game, difficulty)
+            latencies.append((time.perf_counter() - tBefore) * 1000)
+            nodes += stats.nodes
+        print(f"Difficulty {difficulty}: p50 {percentile(latencies, 0.5):.1f}ms,"
+              f" p90 {percentile(latencies, 0.9):.1f}ms, p99 {percentile(latencies, 0.99):.1f}ms,"
+              f" {nodes / len(positions):.0f} nodes per move")
+
+
+def storeLatency(positions, difficulty=2):
+    # first move of a new session, with an empty store and with the one left by the previous session
+    context = positions[0].context
+    with tempfile.TemporaryDirectory() as storeDir:
+        for run in ("cold", "warm"):
+            stores = StoreFolder(storeDir)
+            context.setStore(stores)
+            context.evalCache.clear()
+            latencies = []
+            for game in positions:
+                context.setPlayer(Game.otherPlayer(game.currentPlayer))
+                tBefore = time.perf_counter()
+                search_difficulty(game, difficulty)
+                latencies.append((time.perf_counter() - tBefore) * 1000)
+            hits = sum(store.hits for store in stores.stores.values())
+            print(f"Position store, {run} start: p50 {percentile(latencies, 0.5):.1f}ms,"
+                  f" p90 {percentile(latencies, 0.9):.1f}ms, {hits} hits on disk")
+            stores.close()
+        context.setStore(None)
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    positions = benchmarkPositions(count)
+    compareSelective(positions, depth)
+    compareSuicidal(positions, depth)
+    comparePolicies(positions, depth)
+    compareMultiPV(positions, depth)
+    compareReductions(positions, depth + 1)
+    compareRegions(endgamePositions(count), depth + 3)
+    difficultyLatency(positions)
+    storeLatency(positions)
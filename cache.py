@@ -0,0 +1,66 @@
+"""
+Position hashing and a bounded LRU cache for evaluations.
+
+Positions are hashed with Zobrist keys: every (cell, value) pair has a random
+64 bit key and the hash of a board is the XOR of the keys of its non-empty
+cells, so colouring a rectangle only XORs in the keys of its cells. The keys
+come from a fixed seed, so the same board has the same hash in every process.
+"""
+import random
+import sys
+from collections import OrderedDict
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def zobristKeys(cells, values=3, seed=0x4A4150):
+    rng = random.Random(seed + cells)
+    return [tuple(rng.getrandbits(64) for value in range(values)) for cell in range(cells)]
+
+
+@lru_cache(maxsize=None)
+def sideKey(player, seed=0x4A4150):
+    # XOR-ed into the board hash for the player to move
+    return random.Random(seed - 1 - player).getrandbits(64)
+
+
+class EvalCache:
+    def __init__(self, maxsize=1 << 18):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # None when the key is not cached
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def memorySize(self):
+        # bytes used by the table and its entries, estimated from one entry
+        size = sys.getsizeof(self.entries)
+        if self.entries:
+            key, value = next(iter(self.entries.items()))
+            entry = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key) + sys.getsizeof(value)
+            size += entry * len(self.entries)
+        return size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitRate": self.hits / total if total else 0.0,
+                "entries": len(self.entries), "maxsize": self.maxsize, "bytes": self.memorySize()}
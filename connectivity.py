@@ -0,0 +1,145 @@
+"""
+Incremental connectivity of the poisoned cells.
+
+Colouring a rectangle can only cut paths between poisoned cells, never add
+new ones. So we keep a witness: a tree of open cells linking every poisoned
+cell. As long as a coloured rectangle misses the witness the poisoned cells
+are still connected; only when it hits the witness we search again.
+
+criticalCells finds the cut vertices that separate poisoned cells, so a move
+covering one of them can be recognised as losing without playing it.
+"""
+from collections import deque
+
+from geometry import geometry
+
+
+class Connectivity:
+    def __init__(self, dimensions, cellTable, terminals, openValues):
+        self.dimensions = dimensions
+        self.cellTable = cellTable
+        self.terminals = list(terminals)
+        self.openValues = openValues
+        self.history = []
+        self.searches = 0
+        self.recompute()
+
+    def copy(self, cellTable):
+        # same witness, bound to the board of a child position
+        other = Connectivity.__new__(Connectivity)
+        other.dimensions = self.dimensions
+        other.cellTable = cellTable
+        other.terminals = self.terminals
+        other.openValues = self.openValues
+        other.history = []
+        other.searches = 0
+        other.connected, other.witness, other.box = self.connected, self.witness, self.box
+        return other
+
+    def neighbours(self, index):
+        return geometry(*self.dimensions).neighbours[index]
+
+    def recompute(self):
+        self.searches += 1
+        self.connected, self.witness = self.search()
+        if self.witness:
+            width = self.dimensions[1]
+            lins = [index // width for index in self.witness]
+            cols = [index % width for index in self.witness]
+            self.box = (min(lins), min(cols), max(lins), max(cols))
+        else:
+            self.box = None
+
+    def search(self):
+        # BFS from one poisoned cell, stopping as soon as all of them are found
+        if len(self.terminals) < 2:
+            return True, frozenset(self.terminals)
+
+        root = self.terminals[0]
+        missing = set(self.terminals[1:])
+        neighbours = geometry(*self.dimensions).neighbours
+        parent = {root: None}
+        q = deque([root])
+        while q and missing:
+            node = q.popleft()
+            for neighbour in neighbours[node]:
+                if neighbour not in parent and self.cellTable[neighbour] in self.openValues:
+                    parent[neighbour] = node
+                    missing.discard(neighbour)
+                    q.append(neighbour)
+        if missing:
+            return False, frozenset()
+
+        witness = {root}
+        for terminal in self.terminals[1:]:
+            node = terminal
+            while node not in witness:
+                witness.add(node)
+                node = parent[node]
+        return True, frozenset(witness)
+
+    def touches(self, rect):
+        if len(self.terminals) < 2 or self.box is None:
+            return False  # nothing to cut apart, the poisoned cells stay connected
+        top, left, bottom, right = rect
+        boxTop, boxLeft, boxBottom, boxRight = self.box
+        if bottom < boxTop or top > boxBottom or right < boxLeft or left > boxRight:
+            return False
+        width = self.dimensions[1]
+        return any(lin * width + col in self.witness
+                   for lin in range(max(top, boxTop), min(bottom, boxBottom) + 1)
+                   for col in range(max(left, boxLeft), min(right, boxRight) + 1))
+
+    def colour(self, rect):
+        # call after the rectangle was coloured on the board
+        if not self.connected or not self.touches(rect):
+            self.history.append(None)
+            return
+        self.history.append((self.connected, self.witness, self.box))
+        self.recompute()
+
+    def uncolour(self):
+        # call after the last coloured rectangle was cleared from the board
+        previous = self.history.pop()
+        if previous is not None:
+            self.connected, self.witness, self.box = previous
+
+
+def criticalCells(dimensions, cellTable, terminals, openValues):
+    """Open cells whose colouring alone disconnects the (connected) poisoned cells."""
+    critical = set()
+    if len(terminals) < 2:
+        return critical
+
+    # iterative Tarjan from one poisoned cell: a cut vertex is critical when the
+    # part it cuts off holds poisoned cells, the root always stays on the other side
+    root = terminals[0]
+    adjacent = geometry(*dimensions).neighbours
+    isTerminal = set(terminals)
+    parent = {root: None}
+    disc = {root: 0}
+    low = {root: 0}
+    count = {root: 1}
+    stack = [(root, iter(adjacent[root]))]
+    while stack:
+        v, neighbours = stack[-1]
+        for u in neighbours:
+            if cellTable[u] not in openValues:
+                continue
+            if u not in disc:
+                parent[u] = v
+                disc[u] = low[u] = len(disc)
+                count[u] = 1 if u in isTerminal else 0
+                stack.append((u, iter(adjacent[u])))
+                break
+            elif u != parent[v]:
+                low[v] = min(low[v], disc[u])
+        else:
+            stack.pop()
+            if stack:
+                p = stack[-1][0]
+                low[p] = min(low[p], low[v])
+                count[p] += count[v]
+                if p != root and low[v] >= disc[p] and count[v] > 0:
+                    critical.add(p)
+    return critical
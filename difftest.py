@@ -0,0 +1,209 @@
+"""
+Differential test of the Hap engine (main.py) against reference.py.
+
+Random seeded positions (a seeded layout, then some random moves) go through
+both engines at the same depth. For every position the harness checks that
+    isFinal gives the same verdict,
+    min_max / alpha_beta give the same score,
+    the best move is legal and the reference scores it just as high,
+    the connectors of the poisoned cells (Game.path and test.py's path) are
+    as small as the reference finds,
+and prints how much faster main.py was. The poisoned cell counts take turns,
+so boards with none or one poisoned cell (nothing to cut apart) are covered
+too. Then whole games are played one after
+the other and again all at once, each on its own thread of this process: every
+game keeps its state in its own context, so no move or score may change. Any
+mismatch is printed and the exit status is 1.
+
+    python difftest.py --positions 40 --depth 2 --sizes 4x4 4x5 --poisoned 0 1 3 --seed 1 --games 300
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import reference
+import test
+from layouts import layout
+from main import MOVE_POLICIES, Context, Game, State, alpha_beta, min_max
+
+TEST_CELLS = {reference.EMPTY: '.', reference.POISONED: '#', 1: '1', 2: '2'}  # the alphabet of test.py
+
+
+def randomPosition(rng, dimensions, poisoned):
+    # (board, player to move) after a random number of random legal moves
+    board = [reference.EMPTY] * (dimensions[0] * dimensions[1])
+    for index in layout(dimensions, poisoned, rng.randrange(1 << 31)):
+        board[index] = reference.POISONED
+    toMove = 1
+    for ply in range(rng.randrange(len(board) // 3 + 1)):
+        if reference.isFinal(dimensions, board, toMove):
+            break
+        rect = rng.choice(reference.legalRectangles(dimensions, board, toMove))
+        board = reference.play(dimensions, board, rect, toMove)
+        toMove = reference.other(toMove)
+    return board, toMove
+
+
+def makeGame(dimensions, board, toMove):
+    game = Game(Context(None, dimensions, board.count(reference.POISONED)), list(board))
+    game.currentPlayer = toMove
+    return game
+
+
+def compareSearch(dimensions, board, toMove, depth, algorithm):
+    # (mismatches, reference seconds, main.py seconds)
+    search = reference.min_max if algorithm == "minmax" else reference.alpha_beta
+    tBefore = time.perf_counter()
+    score, rect = search(dimensions, board, toMove, depth, toMove)
+    referenceTime = time.perf_counter() - tBefore
+
+    game = makeGame(dimensions, board, toMove)
+    game.context.setPlayer(reference.other(toMove))  # the player to move is JMAX, like jmax above
+    tBefore = time.perf_counter()
+    if algorithm == "minmax":
+        state = min_max(State(game, toMove, depth))
+    else:
+        state = alpha_beta(float("-inf"), float("inf"), State(game, toMove, depth))
+    mainTime = time.perf_counter() - tBefore
+
+    mismatches = []
+    if state.score != score:
+        mismatches.append(f"{algorithm} score {state.score}, reference {score}")
+    move = state.move.game.lastMove if state.move is not None else None
+    if move not in reference.legalRectangles(dimensions, board, toMove):
+        mismatches.append(f"{algorithm} best move {move} is not legal")
+    else:
+        child = reference.play(dimensions, board, move, toMove)
+        moveScore = search(dimensions, child, reference.other(toMove), depth - 1, toMove)[0]
+        if moveScore != score:
+            mismatches.append(f"{algorithm} best move {move} scores {moveScore}, the best one {score}")
+    return mismatches, referenceTime, mainTime
+
+
+def compareConnectors(dimensions, board):
+    poisoned = [index for index in range(len(board)) if board[index] == reference.POISONED]
+    expected = reference.steinerSize(dimensions, board, poisoned, (1, 2))
+    mismatches = []
+    found = len(makeGame(dimensions, board, 1).path(poisoned))
+    if found != expected:
+        mismatches.append(f"Game.path has {found} cells, reference {expected}")
+    found = len(test.path([TEST_CELLS[cell] for cell in board], poisoned, dimensions))
+    if found != expected:
+        mismatches.append(f"test.py path has {found} cells, reference {expected}")
+    return mismatches
+
+
+def comparePosition(dimensions, board, toMove, depth, algorithms):
+    mismatches = []
+    expected = reference.isFinal(dimensions, board, toMove)
+    found = makeGame(dimensions, board, toMove).isFinal()
+    if found != expected:
+        mismatches.append(f"isFinal {found}, reference {expected}")
+    times = []
+    if not expected:
+        for algorithm in algorithms:
+            found, referenceTime, mainTime = compareSearch(dimensions, board, toMove, depth, algorithm)
+            mismatches += found
+            times.append((referenceTime, mainTime))
+    mismatches += compareConnectors(dimensions, board)
+    return mismatches, times
+
+
+def playGame(dimensions, poisoned, seed, depth, policy, start=None):
+    # main.py against itself from a seeded position: the moves, their scores and the winner
+    board, toMove = randomPosition(random.Random(seed), dimensions, poisoned)
+    game = makeGame(dimensions, board, toMove)
+    game.context.setMovePolicy(policy)
+    if start is not None:
+        start.wait()  # every game on the board at the same time
+    transcript = []
+    while not game.isFinal():
+        game.context.setPlayer(Game.otherPlayer(game.currentPlayer))
+        state = alpha_beta(float("-inf"), float("inf"), State(game, game.currentPlayer, depth))
+        game = state.move.game
+        transcript.append((game.lastMove, state.score))
+    transcript.append(game.isFinal())
+    return transcript
+
+
+def compareConcurrent(games, sizes, poisonedCounts, depth, rng):
+    # numbers of the games which did not play the same way alone and next to the others, and the seconds.
+    # Neighbouring games differ in board size and move policy, and the threads switch very often,
+    # so anything the games shared would change some of them
+    tasks = [(sizes[number % len(sizes)], poisonedCounts[number % len(poisonedCounts)], rng.randrange(1 << 31), depth,
+              MOVE_POLICIES[number % len(MOVE_POLICIES)]) for number in range(games)]
+    tBefore = time.perf_counter()
+    alone = [playGame(*task) for task in tasks]
+    aloneTime = time.perf_counter() - tBefore
+
+    start = threading.Barrier(games)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    tBefore = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=games) as pool:
+            together = list(pool.map(lambda task: playGame(*task, start), tasks))
+    finally:
+        sys.setswitchinterval(interval)
+    togetherTime = time.perf_counter() - tBefore
+    return [number for number in range(games) if alone[number] != together[number]], aloneTime, togetherTime
+
+
+def boardText(dimensions, board):
+    width = dimensions[1]
+    return '/'.join(''.join(str(cell) for cell in board[lin * width:(lin + 1) * width]) for lin in range(dimensions[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check main.py against the reference engine")
+    parser.add_argument("--positions", type=int, default=30, help="positions per board size")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--sizes", nargs="+", default=["4x4", "4x5"], help="board sizes as NxM")
+    parser.add_argument("--poisoned", type=int, nargs="+", default=[3, 0, 1], help="poisoned cell counts, in turn")
+    parser.add_argument("--algorithms", nargs="+", default=["alphabeta", "minmax"], choices=["alphabeta", "minmax"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--games", type=int, default=200, help="games played at once on threads, 0 for none")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [tuple(int(part) for part in size.split('x')) for size in args.sizes]
+    failures, speedups = 0, []
+    for size, dimensions in zip(args.sizes, sizes):
+        for number in range(args.positions):
+            board, toMove = randomPosition(rng, dimensions, args.poisoned[number % len(args.poisoned)])
+            mismatches, times = comparePosition(dimensions, board, toMove, args.depth, args.algorithms)
+            line = f"{size} #{number:<3} {boardText(dimensions, board)} player {toMove}"
+            for algorithm, (referenceTime, mainTime) in zip(args.algorithms, times):
+                speedup = referenceTime / max(mainTime, 1e-9)
+                speedups.append(speedup)
+                line += f"  {algorithm} {referenceTime * 1000:.1f}ms / {mainTime * 1000:.1f}ms = {speedup:.1f}x"
+            print(line if times else line + "  final")
+            for mismatch in mismatches:
+                print(f"    MISMATCH {mismatch}")
+            failures += bool(mismatches)
+
+    total = len(args.sizes) * args.positions
+    if speedups:
+        geometric = math.exp(sum(math.log(speedup) for speedup in speedups) / len(speedups))
+        print(f"speedup: geometric mean {geometric:.1f}x, min {min(speedups):.1f}x, max {max(speedups):.1f}x")
+    print(f"{total - failures}/{total} positions agree")
+
+    if args.games:
+        different, aloneTime, togetherTime = compareConcurrent(args.games, sizes, args.poisoned, args.depth, rng)
+        for number in different:
+            print(f"    MISMATCH game {number} played differently next to the others")
+        print(f"{args.games - len(different)}/{args.games} games played the same on {args.games} threads"
+              f" ({aloneTime:.1f}s one by one, {togetherTime:.1f}s at once)")
+        failures += len(different)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
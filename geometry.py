@@ -0,0 +1,88 @@
+"""
+Board geometry, built once per board size and shared.
+
+Everything here depends on the dimensions alone: neighbours of a cell, the
+border, rows, columns and diagonals, rays from a cell in a direction and the
+cells of a rectangle and around it. geometry(height, width) builds the tables
+on first use and hands the same object to every game, search and evaluator
+of that size. The tables are tuples, so nobody changes them by accident.
+Indexes are lin * width + col, as in the cell tables of main.py.
+"""
+from functools import lru_cache
+
+# (lin, col) steps: the four sides, then the diagonals
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1))
+
+
+class Geometry:
+    def __init__(self, height, width):
+        self.dimensions = (height, width)
+        self.height, self.width = height, width
+        cells = height * width
+        self.coordinates = tuple(divmod(index, width) for index in range(cells))
+        # down, up, right, left: the order the BFS of main.py and steiner.py always used
+        self.neighbours = tuple(tuple(index + lin * width + col for lin, col in DIRECTIONS[:4]
+                                      if 0 <= self.coordinates[index][0] + lin < height
+                                      and 0 <= self.coordinates[index][1] + col < width)
+                                for index in range(cells))
+        self.border = tuple(lin in (0, height - 1) or col in (0, width - 1) for lin, col in self.coordinates)
+        self.borderCells = tuple(index for index in range(cells) if self.border[index])
+        self.rows = tuple(tuple(range(lin * width, (lin + 1) * width)) for lin in range(height))
+        self.columns = tuple(tuple(range(col, cells, width)) for col in range(width))
+        # rays[index][(dlin, dcol)]: the cells met walking from index that way, up to the edge
+        self.rays = tuple({direction: self.walk(index, direction) for direction in DIRECTIONS}
+                          for index in range(cells))
+        self.lineCache = {}
+        self.rectangleCache = {}
+
+    def walk(self, index, direction):
+        lin, col = self.coordinates[index]
+        cells = []
+        while True:
+            lin, col = lin + direction[0], col + direction[1]
+            if not (0 <= lin < self.height and 0 <= col < self.width):
+                return tuple(cells)
+            cells.append(lin * self.width + col)
+
+    def lines(self, length):
+        # every run of length cells in a row, a column or a diagonal
+        lines = self.lineCache.get(length)
+        if lines is None:
+            lines = []
+            for index in range(self.height * self.width):
+                for direction in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    ray = self.rays[index][direction]
+                    if len(ray) >= length - 1:
+                        lines.append((index,) + ray[:length - 1])
+            lines = self.lineCache[length] = tuple(lines)
+        return lines
+
+    def rectangle(self, rect):
+        # (cells, ring) of the rectangle (top, left, bottom, right): its cells and the cells right
+        # next to it, the corners do not count
+        tables = self.rectangleCache.get(rect)
+        if tables is None:
+            top, left, bottom, right = rect
+            width = self.width
+            cells = tuple(lin * width + col for lin in range(top, bottom + 1) for col in range(left, right + 1))
+            ring = []
+            if top > 0:
+                ring.extend(range((top - 1) * width + left, (top - 1) * width + right + 1))
+            if bottom < self.height - 1:
+                ring.extend(range((bottom + 1) * width + left, (bottom + 1) * width + right + 1))
+            for lin in range(top, bottom + 1):
+                if left > 0:
+                    ring.append(lin * width + left - 1)
+                if right < width - 1:
+                    ring.append(lin * width + right + 1)
+            tables = self.rectangleCache[rect] = (cells, tuple(ring))
+        return tables
+
+    def touchesBorder(self, rect):
+        top, left, bottom, right = rect
+        return top == 0 or left == 0 or bottom == self.height - 1 or right == self.width - 1
+
+
+@lru_cache(maxsize=None)
+def geometry(height, width):
+    return Geometry(height, width)
@@ -0,0 +1,108 @@
+"""
+Incrementally maintained parts of the Hap heuristic (Game.calcScore).
+
+The score of a player is the number of empty cells on the first and last
+row (the last column left out) plus the number of distinct cells that end a
+run of the player's colour: the bottom of every vertical run, its top unless
+on the first row, the left end of every horizontal run unless on the first
+column and its right end unless on the last one. Cell 0 never counts.
+
+Every cell knows how many run ends it is, which keeps the distinct count
+right when a row and a column end on the same cell. A rectangle is played on
+empty cells, so in each of its columns it either extends the run above it
+(whose bottom end moves down) or starts a run (a new top end), and the same
+below it and along its rows. A move only looks at the cells around the
+rectangle. The cell table is shared with the game and updated by it.
+"""
+
+
+class Heuristic:
+    def __init__(self, dimensions, cellTable, players, emptyValue):
+        self.dimensions = dimensions
+        self.cellTable = cellTable
+        height, width = dimensions
+        self.borderRows = [0, height - 1]  # the same row twice on a one row board
+        self.borderEmpty = sum(1 for lin in self.borderRows for col in range(width - 1)
+                               if cellTable[lin * width + col] == emptyValue)
+        self.ends = {player: [0] * (height * width) for player in players}
+        self.endCount = dict.fromkeys(players, 0)
+        for player in players:
+            counts = self.ends[player]
+            for index in self.runEnds(player):
+                counts[index] += 1
+            self.endCount[player] = sum(1 for count in counts[1:] if count)
+
+    def score(self, player):
+        return self.borderEmpty + self.endCount[player]
+
+    def runEnds(self, player):
+        # every run end of the player, once per run it ends
+        height, width = self.dimensions
+        cellTable = self.cellTable
+        for index in range(height * width):
+            if cellTable[index] != player:
+                continue
+            lin, col = divmod(index, width)
+            if lin == height - 1 or cellTable[index + width] != player:
+                yield index  # bottom
+            if lin > 0 and cellTable[index - width] != player:
+                yield index  # top
+            if col > 0 and cellTable[index - 1] != player:
+                yield index  # left
+            if col < width - 1 and cellTable[index + 1] != player:
+                yield index  # right
+
+    def update(self, rect, player, change):
+        # change 1 when the rectangle was coloured, -1 when it was emptied again
+        top, left, bottom, right = rect
+        height, width = self.dimensions
+        cellTable = self.cellTable
+        for lin in self.borderRows:
+            if top <= lin <= bottom:
+                self.borderEmpty -= change * max(0, min(right, width - 2) - left + 1)
+
+        # ends of the rectangle and ends of the neighbouring runs it joins, when it is coloured
+        ends, joined = [], []
+        for col in range(left, right + 1):
+            if top > 0:
+                above = (top - 1) * width + col
+                if cellTable[above] == player:
+                    joined.append(above)
+                else:
+                    ends.append(top * width + col)
+            below = (bottom + 1) * width + col
+            if bottom < height - 1 and cellTable[below] == player:
+                joined.append(below)
+            else:
+                ends.append(bottom * width + col)
+        for lin in range(top, bottom + 1):
+            start = lin * width
+            if left > 0:
+                if cellTable[start + left - 1] == player:
+                    joined.append(start + left - 1)
+                else:
+                    ends.append(start + left)
+            if right < width - 1:
+                if cellTable[start + right + 1] == player:
+                    joined.append(start + right + 1)
+                else:
+                    ends.append(start + right)
+
+        gained, lost = (ends, joined) if change > 0 else (joined, ends)
+        counts = self.ends[player]
+        distinct = 0
+        for index in gained:
+            counts[index] += 1
+            if counts[index] == 1 and index:
+                distinct += 1
+        for index in lost:
+            counts[index] -= 1
+            if not counts[index] and index:
+                distinct -= 1
+        self.endCount[player] += distinct
+
+    def play(self, rect, player):
+        self.update(rect, player, 1)
+
+    def undo(self, rect, player):
+        self.update(rect, player, -1)
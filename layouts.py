@@ -0,0 +1,96 @@
+"""
+Seeded layouts of the poisoned cells.
+
+A layout is the sorted tuple of the poisoned cell indexes. The cells are
+drawn with random.sample, so high densities cost no more than low ones, and
+the same seed always gives the same layouts. A layout is valid when the first
+player has a move that does not lose on the spot: an empty border cell (every
+first move touches the border) whose colouring keeps the poisoned cells
+connected, which only a one cell wide board can fail. Invalid draws are
+redrawn from the same generator.
+
+    python layouts.py 5 6 3 --seed 7 --count 1000000 > positions.txt
+writes one position per line in the text format of batch.py.
+"""
+import argparse
+import random
+import sys
+import time
+
+from connectivity import criticalCells
+from geometry import geometry
+
+EMPTY, POISONED = '.', 0
+
+
+def borderCells(dimensions):
+    return geometry(*dimensions).borderCells
+
+
+def isValid(dimensions, cells, border=None):
+    poisoned = set(cells)
+    free = [index for index in (borderCells(dimensions) if border is None else border) if index not in poisoned]
+    if not free:
+        return False
+    if min(dimensions) > 1:
+        return True  # nothing is coloured yet and a full grid has no cut vertex
+    cellTable = [POISONED if index in poisoned else EMPTY for index in range(dimensions[0] * dimensions[1])]
+    critical = criticalCells(dimensions, cellTable, list(cells), {EMPTY, POISONED})
+    return any(index not in critical for index in free)
+
+
+def iterLayouts(dimensions, poisoned, seed=None, count=None, attempts=1000):
+    # count layouts (endless when None); gives up when no valid layout turns up in attempts draws
+    cells = dimensions[0] * dimensions[1]
+    if not 0 <= poisoned < cells:
+        raise ValueError(f"{poisoned} poisoned cells do not fit on a {dimensions[0]}x{dimensions[1]} board")
+    rng = random.Random(seed)
+    border = borderCells(dimensions)
+    produced = 0
+    while count is None or produced < count:
+        for attempt in range(attempts):
+            layout = tuple(sorted(rng.sample(range(cells), poisoned)))
+            if isValid(dimensions, layout, border):
+                break
+        else:
+            raise ValueError(f"no valid layout of {poisoned} poisoned cells on a {dimensions[0]}x{dimensions[1]} board")
+        yield layout
+        produced += 1
+
+
+def layout(dimensions, poisoned, seed=None):
+    return next(iterLayouts(dimensions, poisoned, seed, 1))
+
+
+def boardText(dimensions, cells):
+    # the board as in batch.py: '.' empty, '0' poisoned, rows split by '/'
+    height, width = dimensions
+    cells = set(cells)
+    return '/'.join(''.join('0' if lin * width + col in cells else '.' for col in range(width))
+                    for lin in range(height))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream seeded poisoned cell layouts")
+    parser.add_argument("N", type=int)
+    parser.add_argument("M", type=int)
+    parser.add_argument("O", type=int, help="poisoned cells")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--count", type=int, default=None, help="layouts to write, endless if missing")
+    args = parser.parse_args()
+
+    dimensions = (args.N, args.M)
+    tBefore = time.perf_counter()
+    produced = 0
+    try:
+        for cells in iterLayouts(dimensions, args.O, args.seed, args.count):
+            sys.stdout.write(f"{args.N} {args.M} {boardText(dimensions, cells)} 1\n")
+            produced += 1
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    elapsed = time.perf_counter() - tBefore
+    print(f"{produced} layouts in {elapsed:.2f}s ({produced / max(elapsed, 1e-9):.0f} per second)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
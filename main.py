@@ -1,11 +1,24 @@
 import sys
 import time
-from copy import deepcopy
+from copy import copy
 from queue import Queue
 
 import pygame
 import pygame_menu
-import random
+
+from cache import EvalCache, sideKey, zobristKeys
+from connectivity import Connectivity, criticalCells
+from geometry import geometry
+from heuristic import Heuristic
+from layouts import layout
+from moveset import MoveSet
+from regions import Regions
+from records import RecordWriter, checkSeed
+from render import Renderer, renderText, scaledImage
+from scheduler import ENGINE_DONE, ENGINE_FAILED, HINTS_READY, Scheduler
+from search import EXACT, Search, SearchStats, SearchTimeout, TranspositionTable
+from store import StoreFolder
+from steiner import steinerTree, shortestPath
 
 
 class Button:
@@ -25,8 +38,7 @@ class Button:
         self.fontSize = fontSize
         self.textColor = textColor
         self.value = value
-        fontObj = pygame.font.SysFont(self.font, self.fontSize)
-        self.text = fontObj.render(self.text, True, self.textColor)
+        self.text = renderText(self.text, self.font, self.fontSize, self.textColor)
         self.rect = pygame.Rect(left, top, w, h)
 
         # Centre text
@@ -48,8 +60,7 @@ class Button:
         self.textRect = self.text.get_rect(center=self.rect.center)
 
     def draw(self):
-        pygame.draw.rect(self.display, self.backgroundColorSelected if self.selected else self.backgroundColor,
-                         self.rect)
+        self.display.rect(self.backgroundColorSelected if self.selected else self.backgroundColor, self.rect)
         self.display.blit(self.text, self.textRect)
 
 
@@ -94,105 +105,195 @@ class ButtonsGroup:
         self.indexSelected = None
 
 
+class Context:
+    # everything a game shares with the positions searched from it: the board, the sides, the evaluation
+    # cache, the window and the search settings. Every game has its own, so any number of games can be
+    # played and searched side by side in one process
+    def __init__(self, display, dimensions, poisoned):
+        self.display = display
+        self.dimensions = dimensions
+        self.poisoned = poisoned
+        self.mode = 1  # player vs computer
+        self.algorithm = "alphabeta"
+        self.difficulty = 3
+        self.JMIN = None
+        self.JMAX = None
+        # evaluations are kept from one move to the next for the whole game
+        self.evalCache = EvalCache()
+        # a win has to be worth more than any heuristic score
+        self.maxScore = 3 * dimensions[0] * dimensions[1]
+        # selective search: how many rectangles to keep from each source, by remaining depth
+        self.selective = False
+        self.candidateWidth = {}
+        self.candidateWidthDefault = 8
+        # leave out rectangles which disconnect the poisoned cells (they lose at once)
+        self.dropSuicidal = True
+        # which legal rectangles the search looks at, one of MOVE_POLICIES
+        self.movePolicy = "all"
+        # search only the regions which matter, the others summed up by their spare moves and nimbers (regions.py)
+        self.splitRegions = False
+        # selective search extensions, see search.py: None or the settings of search.LMR / search.NULL_MOVE
+        self.lmr = None
+        self.nullMove = None
+        # the on-disk position stores (a store.StoreFolder), None to keep searches in memory only
+        self.stores = None
+
+        self.cellGrid = []
+        if display is not None:  # no display when analysing positions
+            self.cellDim = min((display.get_width()) / dimensions[1], display.get_height() / dimensions[0] - 40)
+            self.poisonImage = scaledImage("./images/poison.png", (self.cellDim, self.cellDim))
+
+            # Up and bottom padding:
+            self.topPadding = (display.get_height() - 30 - (self.cellDim + 1) * dimensions[0]) / 2
+            self.leftPadding = (display.get_width() - (self.cellDim + 1) * dimensions[1]) / 2
+
+            for i in range(dimensions[0]):
+                for j in range(dimensions[1]):
+                    cell = pygame.Rect(j * (self.cellDim + 1) + self.leftPadding,
+                                       i * (self.cellDim + 1) + self.topPadding,
+                                       self.cellDim, self.cellDim)
+                    self.cellGrid.append(cell)
+
+    def setMode(self, mode):
+        self.mode = mode
+
+    def setAlgorithm(self, algorithm):
+        self.algorithm = algorithm
+
+    def setPlayer(self, player):
+        self.JMIN = player
+        self.JMAX = Game.player1 if self.JMIN == Game.player2 else Game.player2
+
+    def setSelective(self, selective, candidateWidth=None, candidateWidthDefault=None):
+        self.selective = selective
+        if candidateWidth is not None:
+            self.candidateWidth = candidateWidth
+        if candidateWidthDefault is not None:
+            self.candidateWidthDefault = candidateWidthDefault
+
+    def setDifficulty(self, difficulty):
+        self.difficulty = difficulty
+
+    def setReductions(self, lmr=None, nullMove=None):
+        self.lmr = lmr
+        self.nullMove = nullMove
+
+    def setMovePolicy(self, policy):
+        if policy not in MOVE_POLICIES:
+            raise ValueError(f"unknown move policy {policy}, expected one of {', '.join(MOVE_POLICIES)}")
+        self.movePolicy = policy
+
+    def setRegions(self, splitRegions):
+        self.splitRegions = splitRegions
+
+    def setStore(self, stores):
+        self.stores = stores
+
+    def positionStore(self):
+        # one file per board size and search settings, scores of different trees do not mix
+        if self.stores is None:
+            return None
+        width = "full"
+        if self.selective:
+            width = f"w{self.candidateWidthDefault}" + "".join(f"-d{depth}w{k}"
+                                                               for depth, k in sorted(self.candidateWidth.items()))
+        policy = "" if self.movePolicy == "all" else f"-{self.movePolicy}"
+        # reduced searches score differently from full ones
+        lmr = "" if self.lmr is None else "-lmr{moves}.{depth}.{reduction}".format(**self.lmr)
+        nullMove = "" if self.nullMove is None else "-null{reduction}.{depth}{verified}".format(
+            verified="v" if self.nullMove["verify"] else "", **self.nullMove)
+        return self.stores.get(f"hap-{self.dimensions[0]}x{self.dimensions[1]}-{width}{policy}{lmr}{nullMove}"
+                               f"{'-regions' if self.splitRegions else ''}{'' if self.dropSuicidal else '-all'}.bin")
+
+
 class Game:
-    JMIN = None
-    JMAX = None
-    cellDim = 150
     player1 = 1
     player2 = 2
     emptyCell = '.'
     poisonedCell = 0
-    maxScore = 0
+    # getMostX directions as (lin, col) steps
+    rayDirections = {"up": (1, 0), "down": (-1, 0), "left": (0, -1), "right": (0, 1)}
 
     def displayText(self, text, top, height, font="arial", fontSize=15, textColor=(255, 250, 226)):
-        fontObj = pygame.font.SysFont(font, fontSize)
-        textRender = fontObj.render(text, True, textColor)
         rect = pygame.Rect(0, top, self.display.get_width(), height - 1)
-        textRect = textRender.get_rect(center=rect.center)
-        self.display.blit(textRender, textRect)
-
-    def __init__(self, display, dimensions, poisoned, matrix=None):
+        self.display.text(text, rect, font, fontSize, textColor, background=self.display.background)
+
+    def __init__(self, context, matrix=None, seed=None):
+        self.context = context
+        self.display = context.display
+        self.dimensions = context.dimensions
+        self.poisoned = context.poisoned
+        self.cellGrid = context.cellGrid
+        self.currentPlayer = self.player1
         self.lastMove = None
         self.marked = []
+        self.history = []
+        self.connectivity = None
+        self.critical = None
+        self.hash = None
+        self.moveSet = None
+        self.heuristic = None
         if matrix is None:
-            self.init(display, dimensions, poisoned)
+            # the same seed gives the same board, and the first player always has a move that does not lose at once
+            self.cellTable = [self.emptyCell] * self.dimensions[0] * self.dimensions[1]
+            for position in layout(self.dimensions, self.poisoned, seed):
+                self.cellTable[position] = self.poisonedCell
         else:  # while in game
             self.cellTable = matrix
 
-    @classmethod
-    def init(cls, display, dimensions, poisoned):
-        cls.display = display
-        cls.mode = 1  # player vs computer
-        cls.cellTable = [cls.emptyCell] * dimensions[0] * dimensions[1]
-        cls.cellGrid = []
-        cls.dimensions = dimensions
-        cls.poisoned = poisoned
-        cls.cellDim = min((display.get_width()) / dimensions[1], display.get_height() / dimensions[0] - 40)
-        cls.poisonImage = pygame.transform.scale(pygame.image.load("./images/poison.png"), (cls.cellDim, cls.cellDim))
-
-        # Up and bottom padding:
-        cls.topPadding = (display.get_height() - 30 - (cls.cellDim + 1) * dimensions[0]) / 2
-        cls.leftPadding = (display.get_width() - (cls.cellDim + 1) * dimensions[1]) / 2
-
-        for i in range(dimensions[0]):
-            for j in range(dimensions[1]):
-                cell = pygame.Rect(j * (cls.cellDim + 1) + cls.leftPadding,
-                                   i * (cls.cellDim + 1) + cls.topPadding,
-                                   cls.cellDim, cls.cellDim)
-                cls.cellGrid.append(cell)
-
-        while poisoned:
-            position = random.randint(0, dimensions[0] * dimensions[1] - 1)
-            if cls.cellTable[position] == cls.emptyCell:
-                cls.cellTable[position] = cls.poisonedCell
-                poisoned -= 1
-
-        cls.currentPlayer = 1
-
-    @classmethod
-    def setMode(cls, mode):
-        cls.mode = mode
-
-    @classmethod
-    def setAlgorithm(cls, algorithm):
-        cls.algorithm = algorithm
-
-    @classmethod
-    def setPlayer(cls, player):
-        cls.JMIN = player
-        cls.JMAX = cls.player1 if cls.JMIN == cls.player2 else cls.player2
-
     def drawBoard(self):
-        self.displayText(f"{'Red' if self.currentPlayer == 1 else 'Blue'} has to move",
-                         0, self.__class__.topPadding, fontSize=int(self.__class__.topPadding // 2))
+        # only the cells which look different from the last frame are drawn again
+        display, context = self.display, self.context
+        if display.changed("header", self.currentPlayer):
+            self.displayText(f"{'Red' if self.currentPlayer == 1 else 'Blue'} has to move",
+                             0, context.topPadding, fontSize=int(context.topPadding // 2))
 
         for i in range(len(self.cellGrid)):
-            if i in self.marked:
-                pygame.draw.rect(self.__class__.display, (100, 100, 100), self.cellGrid[i])
-            elif self.cellTable[i] == self.poisonedCell:
-                pygame.draw.rect(self.__class__.display, (255, 255, 255), self.cellGrid[i])
-                self.__class__.display.blit(self.__class__.poisonImage, (
-                    i % self.__class__.dimensions[1] * (self.__class__.cellDim + 1) + self.__class__.leftPadding,
-                    i // self.__class__.dimensions[1] * (self.__class__.cellDim + 1) + self.__class__.topPadding))
-            elif self.cellTable[i] == self.player1:
-                pygame.draw.rect(self.__class__.display, (192, 50, 33), self.cellGrid[i])
-            elif self.cellTable[i] == self.player2:
-                pygame.draw.rect(self.__class__.display, (48, 102, 190), self.cellGrid[i])
+            value = "marked" if i in self.marked else self.cellTable[i]
+            if not display.changed(i, value):
+                continue
+            if value == "marked":
+                display.rect((100, 100, 100), self.cellGrid[i])
+            elif value == self.poisonedCell:
+                display.rect((255, 255, 255), self.cellGrid[i])
+                display.blit(context.poisonImage, self.cellGrid[i].topleft)
+            elif value == self.player1:
+                display.rect((192, 50, 33), self.cellGrid[i])
+            elif value == self.player2:
+                display.rect((48, 102, 190), self.cellGrid[i])
             else:
-                pygame.draw.rect(self.__class__.display, (255, 255, 255), self.cellGrid[i])
-
-        if self.__class__.mode == 3:
-            self.displayText("Press any key to continue", self.display.get_height() - self.__class__.topPadding,
-                             self.__class__.topPadding, fontSize=int(self.__class__.topPadding // 2))
-
-        pygame.display.flip()
+                display.rect((255, 255, 255), self.cellGrid[i])
+
+        if context.mode == 3 and display.changed("footer", True):
+            self.displayText("Press any key to continue", self.display.get_height() - context.topPadding,
+                             context.topPadding, fontSize=int(context.topPadding // 2))
+
+        display.flush()
+
+    def drawMessage(self, text):
+        # in the footer, until the board draws its own footer again
+        if self.display.changed("footer", text):
+            self.displayText(text, self.display.get_height() - self.context.topPadding, self.context.topPadding,
+                             fontSize=int(self.context.topPadding // 3))
+            self.display.flush()
+
+    def drawHints(self, depth, lines):
+        # best rectangles for the side to move, next to the buttons
+        text = ""
+        if lines:
+            text = f"Hints (depth {depth}): " + ", ".join(f"({top},{left})-({bottom},{right}) {score:+}"
+                                                        for score, (top, left, bottom, right) in lines)
+        left = self.context.leftPadding + 180
+        rect = pygame.Rect(left, self.display.get_height() - self.context.topPadding - 20,
+                           self.display.get_width() - left - self.context.leftPadding, 30)
+        self.display.text(text, rect, "arial", 14, (255, 250, 226), background=self.display.background)
 
     def finalScreen(self):
         self.display.fill((20, 20, 20))
         self.displayText(f"{'Red' if self.currentPlayer == 1 else 'Blue'} has won !!!!",
                          0, self.display.get_height(),
                          fontSize=int(self.display.get_height() // 6))
-        pygame.display.flip()
+        self.display.flush()
 
     @classmethod
     def otherPlayer(cls, player):
@@ -229,30 +330,29 @@ class Game:
         return True
 
     def colorSelection(self):
-        for index in self.marked:
-            self.cellTable[index] = self.currentPlayer
+        if self.marked:
+            connectivity = self.getConnectivity()
+            keys = zobristKeys(len(self.cellTable))
+            for index in self.marked:
+                self.cellTable[index] = self.currentPlayer
+                if self.hash is not None:
+                    self.hash ^= keys[index][self.currentPlayer]
+            lins = [index // self.dimensions[1] for index in self.marked]
+            cols = [index % self.dimensions[1] for index in self.marked]
+            self.lastMove = (min(lins), min(cols), max(lins), max(cols))
+            connectivity.colour(self.lastMove)
+            self.critical = None
         self.marked = []
 
     def verifyMove(self, left, right):
-        indexLeft = (left[1] // self.dimensions[1], left[1] % self.dimensions[1])
-        indexRight = (right[1] // self.dimensions[1], right[1] % self.dimensions[1])
-
-        nextTo = False
-        border = False
-        # Parcurgere matrice
-        for lin in range(min(indexLeft[0], indexRight[0]), max(indexLeft[0], indexRight[0]) + 1):
-            if lin == 0 or lin == self.dimensions[0] - 1:
-                border = True
-            for col in range(min(indexLeft[1], indexRight[1]), max(indexLeft[1], indexRight[1]) + 1):
-                if col == 0 or col == self.dimensions[1] - 1:
-                    border = True
-                if self.cellTable[lin * self.dimensions[1] + col] != self.emptyCell:
-                    return False
-                neighbours = self.neighbours(lin * self.dimensions[1] + col)
-                for neighbour in neighbours:
-                    if self.cellTable[neighbour] == self.currentPlayer:
-                        nextTo = True
-        return nextTo or border
+        tables = geometry(*self.dimensions)
+        (linLeft, colLeft), (linRight, colRight) = tables.coordinates[left[1]], tables.coordinates[right[1]]
+        rect = (min(linLeft, linRight), min(colLeft, colRight), max(linLeft, linRight), max(colLeft, colRight))
+        cells, ring = tables.rectangle(rect)
+        if any(self.cellTable[index] != self.emptyCell for index in cells):
+            return False
+        # inside the rectangle everything is empty, so only the ring can be next to our colour
+        return tables.touchesBorder(rect) or any(self.cellTable[index] == self.currentPlayer for index in ring)
 
     def countEmpty(self, index, sense="row"):
         if sense == "row":
@@ -294,27 +394,70 @@ class Game:
     def getPoisonedIdx(self):
         return [i for i in range(len(self.cellTable)) if self.cellTable[i] == self.poisonedCell]
 
+    def getConnectivity(self):
+        if self.connectivity is None:
+            self.connectivity = Connectivity(self.dimensions, self.cellTable, self.getPoisonedIdx(),
+                                             {self.emptyCell, self.poisonedCell})
+        return self.connectivity
+
+    def getHash(self):
+        if self.hash is None:
+            keys = zobristKeys(len(self.cellTable))
+            self.hash = 0
+            for index, value in enumerate(self.cellTable):
+                if value != self.emptyCell:
+                    self.hash ^= keys[index][value]
+        return self.hash
+
+    def rectangleHash(self, rect, player):
+        top, left, bottom, right = rect
+        keys = zobristKeys(len(self.cellTable))
+        result = 0
+        for lin in range(top, bottom + 1):
+            for col in range(left, right + 1):
+                result ^= keys[lin * self.dimensions[1] + col][player]
+        return result
+
+    def getCritical(self):
+        # 2D prefix sums over the critical cells, so any rectangle is checked in O(1)
+        if self.critical is None:
+            height, width = self.dimensions
+            critical = criticalCells(self.dimensions, self.cellTable, self.getPoisonedIdx(),
+                                     {self.emptyCell, self.poisonedCell})
+            sums = [0] * ((height + 1) * (width + 1))
+            for lin in range(height):
+                rowSum = 0
+                for col in range(width):
+                    rowSum += lin * width + col in critical
+                    sums[(lin + 1) * (width + 1) + col + 1] = sums[lin * (width + 1) + col + 1] + rowSum
+            self.critical = sums
+        return self.critical
+
+    def isSuicidal(self, rect):
+        top, left, bottom, right = rect
+        sums = self.getCritical()
+        width = self.dimensions[1] + 1
+        return sums[(bottom + 1) * width + right + 1] - sums[top * width + right + 1] \
+            - sums[(bottom + 1) * width + left] + sums[top * width + left] > 0
+
     def isFinal(self):
-        if not self.path(self.getPoisonedIdx()):
+        key = (self.getHash(), self.currentPlayer, "final")
+        result = self.context.evalCache.get(key)
+        if result is None:
+            result = self.computeFinal()
+            self.context.evalCache.put(key, result)
+        return result
+
+    def computeFinal(self):
+        if not self.getConnectivity().connected:
             return self.currentPlayer
-        elif self.countEmpty() == 0:
+        elif not self.hasMoves(self.currentPlayer):  # also covers the full board
             return self.otherPlayer(self.currentPlayer)
         else:
             return False
 
     def neighbours(self, index):
-        result = []
-        r, c = index // self.dimensions[1], index % self.dimensions[1]
-
-        if r + 1 < self.dimensions[0]:
-            result.append((r + 1) * self.dimensions[1] + c)
-        if r - 1 >= 0:
-            result.append((r - 1) * self.dimensions[1] + c)
-        if c + 1 < self.dimensions[1]:
-            result.append(r * self.dimensions[1] + c + 1)
-        if c - 1 >= 0:
-            result.append(r * self.dimensions[1] + c - 1)
-        return result
+        return geometry(*self.dimensions).neighbours[index]
 
     def bfs(self, start):
         q = Queue()
@@ -333,47 +476,41 @@ class Game:
 
     def estScore(self, depth):
         finalPlayer = self.isFinal()
+        context = self.context
 
-        if finalPlayer == self.JMAX:
-            return self.maxScore + depth
-        elif finalPlayer == self.JMIN:
-            return -self.maxScore - depth
+        if finalPlayer == context.JMAX:
+            return context.maxScore + depth
+        elif finalPlayer == context.JMIN:
+            return -context.maxScore - depth
         else:
-            return self.calcScore(self.JMAX) - self.calcScore(self.JMIN)
+            return self.calcScore(context.JMAX) - self.calcScore(context.JMIN)
 
     def getMostX(self, player, index, direction='up'):
-        r, c = index // self.dimensions[1], index % self.dimensions[1]
-
-        if direction == "up":
-            while r + 1 < self.dimensions[0] and self.cellTable[(r + 1) * self.dimensions[1] + c] == player:
-                r = r + 1
-
-            if r == self.dimensions[0]:
-                return None
-            return r * self.dimensions[1] + c
-        elif direction == "down":
-            while r - 1 >= 0 and self.cellTable[(r - 1) * self.dimensions[1] + c] == player:
-                r = r - 1
-
-            if r == 0:
-                return None
-            return r * self.dimensions[1] + c
-        elif direction == "left":
-            while c - 1 >= 0 and self.cellTable[r * self.dimensions[1] + c - 1] == player:
-                c = c - 1
-
-            if c == 0:
-                return None
-            return r * self.dimensions[1] + c
-        elif direction == "right":
-            while c + 1 < self.dimensions[1] and self.cellTable[r * self.dimensions[1] + c + 1] == player:
-                c = c + 1
-
-            if c == self.dimensions[1] - 1:
-                return None
-            return r * self.dimensions[1] + c
+        # last cell of the player's run from index in that direction, None when it lies on the edge
+        # the direction leads to (going up never gives None)
+        tables = geometry(*self.dimensions)
+        end = index
+        for cell in tables.rays[index][self.rayDirections[direction]]:
+            if self.cellTable[cell] != player:
+                break
+            end = cell
+        lin, col = tables.coordinates[end]
+        if (direction == "down" and lin == 0) or (direction == "left" and col == 0) \
+                or (direction == "right" and col == self.dimensions[1] - 1):
+            return None
+        return end
 
     def calcScore(self, player):
+        if self.heuristic is not None:
+            return self.heuristic.score(player)
+        key = (self.getHash(), player, "score")
+        result = self.context.evalCache.get(key)
+        if result is None:
+            result = self.computeScore(player)
+            self.context.evalCache.put(key, result)
+        return result
+
+    def computeScore(self, player):
         borderEmpty = 0
         aux = [0, self.dimensions[0] - 1]
         for lin in aux:
@@ -381,7 +518,7 @@ class Game:
                 if self.cellTable[lin * self.dimensions[1] + col] == self.emptyCell:
                     borderEmpty += 1
         used = []
-        for index in range(self.cellTable):
+        for index in range(len(self.cellTable)):
             if self.cellTable[index] == player and index not in used:
                 directions = ['up', 'down', 'left', 'right']
                 for dir in directions:
@@ -390,76 +527,248 @@ class Game:
                         used.append(m)
         return borderEmpty + len(used)
 
-    def rec(self, start, rest, explored, path):
-        min = []
-        if not rest:
-            return path
-
-        for val in rest:
-            p = self.BFS_SP(start, val, deepcopy(explored))
-            if not p:
-                return []
-            cp = deepcopy(rest)
-            cp.remove(val)
-            dr = self.rec(val, cp, explored + [start], path[:-1] + p)
-            if min == [] or len(dr) < len(min):
-                min = dr
-
-        return min
-
     def path(self, l):
-        minPath = []
-
-        for index in range(len(l)):
-            p = self.rec(l[index], l[:index] + l[(index + 1):], [], [])
-            if minPath == [] or len(minPath) > len(p):
-                minPath = p
-
-        return minPath
-
-    def BFS_SP(self, start, goal, explored = []):
-        q = Queue()
-        q.put([start])
-        if start == goal:
-            return []
-
-        while not q.empty():
-            path = q.get()
-            node = path[-1]
-
-            if node not in explored:
-                n = self.neighbours(node)
-
-                for neighbour in n:
-                    if self.cellTable[neighbour] == self.player1 or self.cellTable[neighbour] == self.player2:
-                        continue
-                    if neighbour in explored:
-                        continue
-                    new_path = list(path)
-                    new_path.append(neighbour)
-                    q.put(new_path)
+        return steinerTree(self.dimensions, self.cellTable, l, (self.player1, self.player2))
 
-                    if neighbour == goal:
-                        return new_path
+    def BFS_SP(self, start, goal):
+        return shortestPath(self.dimensions, self.cellTable, start, goal, (self.player1, self.player2))
 
-                explored.append(node)
-
-        return []
-
-    def generateAllMoves(self, leftTop):
-        # always go right down
-        l_moves = []
-
-
-
-    def move(self, player):
-        l_moves = []
-        for lin in range(self.dimensions[0]):
-            for col in range(self.dimensions[1]):
-                if self.cellTable[lin * self.dimensions[1] + col] == self.emptyCell:
-                    if lin == 0 or col == 0 or lin == self.dimensions[0] - 1 or col == self.dimensions[1] - 1:
+    def isLegalRectangle(self, rect, player):
+        # rect = (top, left, bottom, right), already known to be empty
+        if geometry(*self.dimensions).touchesBorder(rect):
+            return True
+        return self.contact(rect, player) > 0
+
+    def contact(self, rect, player):
+        # number of cells of player right next to the rectangle
+        cellTable = self.cellTable
+        return sum(1 for index in geometry(*self.dimensions).rectangle(rect)[1] if cellTable[index] == player)
+
+    def hasMoves(self, player):
+        if self.moveSet is not None:
+            return self.moveSet.legal[player] != 0
+        # a single empty cell is the smallest rectangle, so it is enough to look for one
+        for index in range(len(self.cellTable)):
+            if self.cellTable[index] == self.emptyCell:
+                lin, col = index // self.dimensions[1], index % self.dimensions[1]
+                if self.isLegalRectangle((lin, col, lin, col), player):
+                    return True
+        return False
 
+    def rectangles(self, player):
+        if self.moveSet is not None:
+            yield from self.moveSet.rectangles(player)
+            return
+        # always go right down from the top left corner
+        height, width = self.dimensions
+        for top in range(height):
+            for left in range(width):
+                if self.cellTable[top * width + left] != self.emptyCell:
+                    continue
+                maxRight = width - 1
+                for bottom in range(top, height):
+                    right = left
+                    while right <= maxRight and self.cellTable[bottom * width + right] == self.emptyCell:
+                        right += 1
+                    maxRight = right - 1
+                    if maxRight < left:
+                        break
+                    for right in range(left, maxRight + 1):
+                        rect = (top, left, bottom, right)
+                        if self.isLegalRectangle(rect, player):
+                            yield rect
+
+    def applyMove(self, rect, player):
+        top, left, bottom, right = rect
+        cellTable = list(self.cellTable)
+        for lin in range(top, bottom + 1):
+            start = lin * self.dimensions[1]
+            cellTable[start + left:start + right + 1] = [player] * (right - left + 1)
+
+        game = Game(self.context, cellTable)
+        game.currentPlayer = self.otherPlayer(player)
+        game.lastMove = rect
+        game.connectivity = self.getConnectivity().copy(cellTable)
+        game.connectivity.colour(rect)
+        game.hash = self.getHash() ^ self.rectangleHash(rect, player)
+        return game
+
+    def copy(self):
+        game = Game(self.context, list(self.cellTable))
+        game.currentPlayer = self.currentPlayer
+        game.lastMove = self.lastMove
+        game.hash = self.hash
+        game.connectivity = self.getConnectivity().copy(game.cellTable)
+        # copies are searched with makeMove/unmakeMove, which keep the legal rectangles up to date
+        game.moveSet = MoveSet(self.dimensions, game.cellTable, (self.player1, self.player2), self.emptyCell)
+        game.heuristic = Heuristic(self.dimensions, game.cellTable, (self.player1, self.player2), self.emptyCell)
+        return game
+
+    def makeMove(self, rect, player=None):
+        # in place version of applyMove, undone by unmakeMove
+        if player is None:
+            player = self.currentPlayer
+        connectivity = self.getConnectivity()
+        self.hash = self.getHash() ^ self.rectangleHash(rect, player)
+        top, left, bottom, right = rect
+        for lin in range(top, bottom + 1):
+            start = lin * self.dimensions[1]
+            self.cellTable[start + left:start + right + 1] = [player] * (right - left + 1)
+        self.history.append((rect, player, self.lastMove, self.currentPlayer))
+        self.lastMove = rect
+        self.currentPlayer = self.otherPlayer(player)
+        self.critical = None
+        connectivity.colour(rect)
+        if self.moveSet is not None:
+            self.moveSet.play(rect, player)
+        if self.heuristic is not None:
+            self.heuristic.play(rect, player)
+
+    def unmakeMove(self):
+        rect, player, self.lastMove, self.currentPlayer = self.history.pop()
+        self.hash ^= self.rectangleHash(rect, player)
+        top, left, bottom, right = rect
+        for lin in range(top, bottom + 1):
+            start = lin * self.dimensions[1]
+            self.cellTable[start + left:start + right + 1] = [self.emptyCell] * (right - left + 1)
+        self.connectivity.uncolour()
+        self.critical = None
+        if self.moveSet is not None:
+            self.moveSet.undo()
+        if self.heuristic is not None:
+            self.heuristic.undo(rect, player)
+
+    def makeNullMove(self):
+        # the player to move passes, Hap has no such move: only null-move pruning uses it
+        self.history.append((None, None, self.lastMove, self.currentPlayer))
+        self.currentPlayer = self.otherPlayer(self.currentPlayer)
+
+    def unmakeNullMove(self):
+        rect, player, self.lastMove, self.currentPlayer = self.history.pop()
+
+    def rectangleScore(self, rect, player):
+        # cheap static score: big rectangles glued to our own colour first
+        top, left, bottom, right = rect
+        return (bottom - top + 1) * (right - left + 1) + self.contact(rect, player)
+
+    def isMaximal(self, rect):
+        top, left, bottom, right = rect
+        width = self.dimensions[1]
+
+        def emptyStrip(lins, cols):
+            return all(self.cellTable[lin * width + col] == self.emptyCell for lin in lins for col in cols)
+
+        if top > 0 and emptyStrip([top - 1], range(left, right + 1)):
+            return False
+        if bottom < self.dimensions[0] - 1 and emptyStrip([bottom + 1], range(left, right + 1)):
+            return False
+        if left > 0 and emptyStrip(range(top, bottom + 1), [left - 1]):
+            return False
+        if right < width - 1 and emptyStrip(range(top, bottom + 1), [right + 1]):
+            return False
+        return True
 
+    def reducedRectangles(self, rects):
+        # policies of MOVE_POLICIES; every legal rectangle grows into a legal maximal one, so none leaves the list empty
+        policy = self.context.movePolicy
+        if policy == "maximal":
+            return [rect for rect in rects if self.isMaximal(rect)]
+        if policy == "sizes":
+            return [rect for rect in rects
+                    if (rect[2] - rect[0] < 2 and rect[3] - rect[1] < 2) or self.isMaximal(rect)]
+        if policy == "dominance":
+            # a rectangle is dominated by its one row or column extension when the extra cells
+            # stay off the witness path of the poisoned cells: both leave the same connections
+            legal = set(rects)
+            witness = self.getConnectivity().witness or frozenset()
+            width = self.dimensions[1]
+
+            def dominated(rect):
+                top, left, bottom, right = rect
+                for bigger, strip in (((top - 1, left, bottom, right), (top - 1, left, top - 1, right)),
+                                      ((top, left, bottom + 1, right), (bottom + 1, left, bottom + 1, right)),
+                                      ((top, left - 1, bottom, right), (top, left - 1, bottom, left - 1)),
+                                      ((top, left, bottom, right + 1), (top, right + 1, bottom, right + 1))):
+                    if bigger in legal and not any(lin * width + col in witness
+                                                   for lin in range(strip[0], strip[2] + 1)
+                                                   for col in range(strip[1], strip[3] + 1)):
+                        return True
+                return False
+
+            return [rect for rect in rects if not dominated(rect)]
+        return rects
+
+    def candidateRectangles(self, player, depth, rects=None):
+        rects = list(self.rectangles(player)) if rects is None else rects
+        k = self.context.candidateWidth.get(depth, self.context.candidateWidthDefault)
+        if len(rects) <= k:
+            return rects
+        rects.sort(key=lambda rect: self.rectangleScore(rect, player), reverse=True)
+
+        # rectangles which cut the current connector of the poisoned cells
+        connector = set(self.path(self.getPoisonedIdx()))
+        width = self.dimensions[1]
+        cutting = [rect for rect in rects
+                   if any(lin * width + col in connector
+                          for lin in range(rect[0], rect[2] + 1) for col in range(rect[1], rect[3] + 1))]
+        # border touching rectangles that can not grow any more
+        border = [rect for rect in rects
+                  if (rect[0] == 0 or rect[1] == 0 or rect[2] == self.dimensions[0] - 1 or rect[3] == width - 1)
+                  and self.isMaximal(rect)]
+
+        candidates = dict.fromkeys(cutting[:k] + border[:k] + rects[:k])
+        return list(candidates)
+
+    def getRegions(self):
+        key = (self.getHash(), "regions")
+        regions = self.context.evalCache.get(key)
+        if regions is None:
+            regions = Regions(self.dimensions, self.cellTable, (self.player1, self.player2), self.emptyCell,
+                              self.poisonedCell, self.context.evalCache)
+            self.context.evalCache.put(key, regions)
+        return regions
+
+    def generateMoves(self, player, depth=None):
+        rects = list(self.rectangles(player))
+        if depth is not None:
+            summary = []
+            if self.context.splitRegions:
+                # the move policy and the selective search only narrow the searched regions
+                rects, summary = self.getRegions().split(rects, player)
+            rects = self.reducedRectangles(rects)
+            if self.context.selective:
+                rects = self.candidateRectangles(player, depth, rects)
+            rects += summary
+        if self.context.dropSuicidal:
+            rects = self.withoutSuicidal(rects)
+        return rects
+
+    def moves(self, player, depth=None):
+        return [self.applyMove(rect, player) for rect in self.generateMoves(player, depth)]
+
+    # game protocol of the shared search (search.py)
+    def legalMoves(self, depth=None):
+        return self.generateMoves(self.currentPlayer, depth)
+
+    def positionHash(self):
+        return self.getHash() ^ sideKey(self.currentPlayer)
+
+    def terminal(self):
+        return bool(self.isFinal())
+
+    def evaluate(self, depth):
+        score = self.estScore(depth)
+        return score if self.currentPlayer == self.context.JMAX else -score
+
+    def withoutSuicidal(self, rects):
+        # a suicidal rectangle is never better than any other move, but one is kept if nothing else is left
+        safe, suicidal = [], None
+        for rect in rects:
+            if not self.isSuicidal(rect):
+                safe.append(rect)
+            elif suicidal is None:
+                suicidal = rect
+        return safe if safe or suicidal is None else [suicidal]
 
     def __str__(self):
         s = ""
@@ -485,7 +794,7 @@ class State:
         self.move = None
 
     def moves(self):
-        possibleMoves = self.game.moves(self.currentPlayer)
+        possibleMoves = self.game.moves(self.currentPlayer, self.depth)
         otherPlayer = self.game.otherPlayer(self.currentPlayer)
         possibleStates = [State(move, otherPlayer, self.depth - 1, parent=self) for move in possibleMoves]
         return possibleStates
@@ -497,60 +806,127 @@ class State:
         return self.__str__()
 
 
-def min_max(state):
-    if state.depth == 0 or state.game.isFinal():
-        state.score = state.game.estimScore(state.depth)
-        return state
-    state.possibleMoves = state.moves()
-    moveScore = [min_max(move) for move in state.possibleMoves]
-
-    if state.currentPlayer == Game.JMAX:
-        state.move = max(moveScore, key=lambda x: x.score)
-    else:
-        state.move = min(moveScore, key=lambda x: x.score)
-    state.score = state.move.score
+def search_state(state, alpha, beta, stats=None, tt=None, pruning=True):
+    # runs the shared negamax on a copy of the position and fills in the state like the old tree search did
+    game = state.game.copy()
+    game.currentPlayer = state.currentPlayer
+    context = game.context
+    sign = 1 if state.currentPlayer == context.JMAX else -1
+    window = (alpha, beta) if sign == 1 else (-beta, -alpha)
+    search = Search(game, stats, tt, pruning=pruning, lmr=context.lmr, nullMove=context.nullMove)
+    score, move = search.negamax(state.depth, *window)
+
+    state.score = sign * score
+    state.move = None
+    if move is not None:
+        state.move = State(state.game.applyMove(move, state.currentPlayer),
+                           Game.otherPlayer(state.currentPlayer), state.depth - 1, parent=state, score=state.score)
     return state
 
 
-def alpha_beta(alpha, beta, state):
-    if state.depth == 0 or state.game.isFinal():
-        state.score = state.game.estimScore(state.depth)
-        return state
-
-    if alpha > beta:
-        return state
-
-    state.possibleMoves = state.moves()
-    if state.currentPlayer == Game.JMAX:
-        currentScore = float("-inf")
-
-        for move in state.possibleMoves:
-            newState = alpha_beta(alpha, beta, move)
-            if currentScore < newState.score:
-                state.move = newState
-                currentScore = newState.score
-            if alpha < newState.score:
-                alpha = newState.score
-                if alpha >= beta:
-                    break
-    elif state.currentPlayer == Game.JMIN:
-        currentScore = float("-inf")
-
-        for move in state.possibleMoves:
-            newState = alpha_beta(alpha, beta, move)
-            if currentScore > newState.score:
-                state.move = newState
-                currentScore = newState.score
-            if beta > newState.score:
-                beta = newState.score
-                if alpha >= beta:
-                    break
-
-    state.score = state.move.score
-    return state
+def min_max(state, stats=None, tt=None):
+    return search_state(state, float("-inf"), float("inf"), stats, tt, pruning=False)
+
+
+def alpha_beta(alpha, beta, state, stats=None, tt=None):
+    return search_state(state, alpha, beta, stats, tt)
+
+
+def iterative_deepening(game, maxDepth, timeLimit=None, nodeLimit=None, algorithm="alphabeta", stats=None):
+    # deepest completed search within the budget; depth 1 always completes, so there is a move to play
+    # unless the search is stopped (stats, when given, replaces the time and node limits)
+    stats = SearchStats(timeLimit, nodeLimit) if stats is None else stats
+    tt = TranspositionTable(backing=game.context.positionStore())
+    # a position searched in an earlier session starts at the depth it was searched to
+    known = tt.probe(game.positionHash())
+    start = min(known[0], maxDepth) if known is not None and known[1] == EXACT else 1
+    best, depthReached = None, 0
+    depth = start
+    while depth <= maxDepth:
+        # only depth 1 runs past the budget, a stored depth could take any time
+        stats.limited = depth > 1
+        state = State(game, game.currentPlayer, depth)
+        try:
+            if algorithm == "minmax":
+                state = min_max(state, stats, tt)
+            else:
+                state = alpha_beta(float("-inf"), float("inf"), state, stats, tt)
+        except SearchTimeout:
+            if best is None and depth > 1 and not stats.stopped:
+                depth = 1  # the stored depth did not fit, still a move to play
+                continue
+            break
+        best, depthReached = state, depth
+        depth += 1
+        if state.move is None or abs(state.score) >= game.context.maxScore:  # nothing left to look for
+            break
+    return best, depthReached, stats
+
+
+def multi_pv(game, maxDepth, count=3, stats=None, callback=None):
+    # the count best moves of the side to move with their scores (for that side), refined depth by depth;
+    # callback(depth, lines) after every completed depth
+    stats = SearchStats() if stats is None else stats
+    tt = TranspositionTable()
+    position = game.copy()
+    # the sides of its own, scored for the side to move whatever the game has set (none between two players)
+    position.context = copy(game.context)
+    position.context.setPlayer(Game.otherPlayer(game.currentPlayer))
+    lines, depthReached = [], 0
+    for depth in range(1, maxDepth + 1):
+        try:
+            found = Search(position, stats, tt).multiPV(depth, count, [move for score, move in lines])
+        except SearchTimeout:
+            break
+        lines, depthReached = found, depth
+        if callback is not None:
+            callback(depth, lines)
+        if not lines or abs(lines[0][0]) >= game.context.maxScore:
+            break
+    return lines, depthReached, stats
 
 
 MAX_DEPTH = 5
+HINT_COUNT = 3
+
+# reduced move lists: every rectangle, only maximal ones, small ones (at most 2x2) and maximal ones,
+# or every rectangle not dominated by a bigger one with the same effect on the poisoned cells
+MOVE_POLICIES = ("all", "maximal", "sizes", "dominance")
+# the policy for a time budget: below each limit (seconds per move) the search has to be narrower
+POLICY_BY_TIME = ((0.5, "maximal"), (5.0, "dominance"))
+
+
+def policy_for_time(timeLimit):
+    for limit, policy in POLICY_BY_TIME:
+        if timeLimit is not None and timeLimit < limit:
+            return policy
+    return "all"
+
+# search budget of every difficulty level: maximum depth, node and time limits,
+# how many candidate rectangles per source are kept (None for full width), the move policy
+# and whether the independent regions are summed up instead of searched. That only pays once
+# several regions have split off (benchmark.compareRegions), over whole games it costs time
+DIFFICULTY = {
+    1: {"depth": 2, "nodes": 500, "time": 0.25, "width": 4, "policy": "maximal", "regions": False},
+    2: {"depth": 3, "nodes": 20000, "time": 2.0, "width": 8, "policy": "dominance", "regions": False},
+    3: {"depth": MAX_DEPTH, "nodes": None, "time": 10.0, "width": None, "policy": "all", "regions": False},
+}
+
+
+def search_difficulty(game, difficulty, algorithm="alphabeta"):
+    budget = DIFFICULTY[difficulty]
+    context = game.context
+    selective, widthDefault, policy = context.selective, context.candidateWidthDefault, context.movePolicy
+    splitRegions = context.splitRegions
+    context.setSelective(budget["width"] is not None, candidateWidthDefault=budget["width"])
+    context.setMovePolicy(budget["policy"])
+    context.setRegions(budget["regions"])
+    try:
+        return iterative_deepening(game, budget["depth"], budget["time"], budget["nodes"], algorithm)
+    finally:
+        context.setSelective(selective, candidateWidthDefault=widthDefault)
+        context.setMovePolicy(policy)
+        context.setRegions(splitRegions)
 
 
 class Menu:
@@ -559,6 +935,10 @@ class Menu:
             self.dimensions = (800, 600)
             self.boardDimensions = (4, 5)
             self.boardPoisoned = 2
+            self.seed = None
+            self.recordPath = None  # games are recorded only when asked for
+            self.stores = None
+            self.engine = None
         else:
             self.dimensions = (800, 600)
             readSettings = open(settingsPath)
@@ -575,25 +955,43 @@ class Menu:
             line = readSettings.readline()
             if line.find("O=") != -1:
                 self.boardPoisoned = int(line.split("O=")[1].strip())
+                line = readSettings.readline()
             else:
                 self.boardPoisoned = 2
 
+            # optional lines: S=<seed> of the poisoned cells, C=<folder> where searched positions are kept,
+            # R=<file> where the games are recorded, E=<host:port or socket path> of an engine server (server.py)
+            self.seed = None
+            self.recordPath = None
+            self.stores = None
+            self.engine = None
+            while line:
+                if line.find("S=") != -1:
+                    self.seed = checkSeed(int(line.split("S=")[1].strip()))
+                elif line.find("C=") != -1:
+                    self.stores = StoreFolder(line.split("C=")[1].strip())
+                elif line.find("R=") != -1:
+                    self.recordPath = line.split("R=")[1].strip()
+                elif line.find("E=") != -1:
+                    from server import EngineClient, parseAddress
+                    self.engine = EngineClient(parseAddress(line.split("E=")[1].strip()))
+                line = readSettings.readline()
+
         pygame.init()
         pygame.display.set_caption("Negrut Maria-Daniela - Hap")
         chocoIcon = pygame.image.load("images/icon.png")
         pygame.display.set_icon(chocoIcon)
-        self.screen = pygame.display.set_mode(self.dimensions)
+        self.screen = Renderer(pygame.display.set_mode(self.dimensions))
         self.screen.fill((20, 20, 20))
-        self.game = Game(self.screen, self.boardDimensions, self.boardPoisoned)
+        self.scheduler = Scheduler(self.screen)
+        self.context = Context(self.screen, self.boardDimensions, self.boardPoisoned)
+        self.context.setStore(self.stores)
+        self.game = Game(self.context, seed=self.seed)
 
         self.typeGame()
 
     def typeGame(self):
-        fontObj = pygame.font.SysFont("Arial", 16)
-        text = fontObj.render("Tipul jocului:  ", True, (255, 255, 255))
-        rect = pygame.Rect(40, 30, 60, 30)
-        textRect = text.get_rect(center=rect.center)
-        self.screen.blit(text, textRect)
+        self.screen.text("Tipul jocului:  ", pygame.Rect(40, 30, 60, 30), "Arial", 16)
 
         btn = ButtonsGroup(
             top=30,
@@ -611,16 +1009,16 @@ class Menu:
         btn.draw()
         ok.draw()
         while True:
-            for ev in pygame.event.get():
+            for ev in self.scheduler.events():
                 if ev.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
                 elif ev.type == pygame.MOUSEBUTTONDOWN:
-                    pos = pygame.mouse.get_pos()
+                    pos = ev.pos
                     if not btn.select(pos):
                         if ok.select(pos):
                             self.screen.fill((20, 20, 20))  # stergere ecran
-                            self.game.setMode(btn.value())
+                            self.context.setMode(btn.value())
                             if btn.value() == 1:
                                 self.menuCvP()
                             elif btn.value() == 3:
@@ -628,14 +1026,9 @@ class Menu:
                             else:
                                 self.play()
 
-            pygame.display.update()
 
     def menuCvC(self):
-        fontObj = pygame.font.SysFont("Arial", 16)
-        text = fontObj.render("Algoritmul folosit: ", True, (255, 255, 255))
-        rect = pygame.Rect(40, 30, 85, 30)
-        textRect = text.get_rect(center=rect.center)
-        self.screen.blit(text, textRect)
+        self.screen.text("Algoritmul folosit: ", pygame.Rect(40, 30, 85, 30), "Arial", 16)
 
         btn_alg = ButtonsGroup(
             top=30,
@@ -652,26 +1045,21 @@ class Menu:
         btn_alg.draw()
         ok.draw()
         while True:
-            for ev in pygame.event.get():
+            for ev in self.scheduler.events():
                 if ev.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
                 elif ev.type == pygame.MOUSEBUTTONDOWN:
-                    pos = pygame.mouse.get_pos()
+                    pos = ev.pos
                     if not btn_alg.select(pos):
                         if ok.select(pos):
                             self.screen.fill((20, 20, 20))  # stergere ecran
-                            self.game.setAlgorithm(btn_alg.value())
+                            self.context.setAlgorithm(btn_alg.value())
                             self.play()
                             return
-            pygame.display.update()
 
     def menuCvP(self):
-        fontObj = pygame.font.SysFont("Arial", 16)
-        text = fontObj.render("Algoritmul folosit: ", True, (255, 255, 255))
-        rect = pygame.Rect(40, 30, 85, 30)
-        textRect = text.get_rect(center=rect.center)
-        self.screen.blit(text, textRect)
+        self.screen.text("Algoritmul folosit: ", pygame.Rect(40, 30, 85, 30), "Arial", 16)
 
         btn_alg = ButtonsGroup(
             top=30,
@@ -683,11 +1071,7 @@ class Menu:
             indexSelected=0
         )
 
-        fontObj = pygame.font.SysFont("Arial", 16)
-        text = fontObj.render("Culoarea jucatorului: ", True, (255, 255, 255))
-        rect = pygame.Rect(40, 100, 100, 30)
-        textRect = text.get_rect(center=rect.center)
-        self.screen.blit(text, textRect)
+        self.screen.text("Culoarea jucatorului: ", pygame.Rect(40, 100, 100, 30), "Arial", 16)
 
         btn_juc = ButtonsGroup(
             top=100,
@@ -701,11 +1085,7 @@ class Menu:
             indexSelected=0
         )
 
-        fontObj = pygame.font.SysFont("Arial", 16)
-        text = fontObj.render("Dificultate: ", True, (255, 255, 255))
-        rect = pygame.Rect(40, 170, 50, 30)
-        textRect = text.get_rect(center=rect.center)
-        self.screen.blit(text, textRect)
+        self.screen.text("Dificultate: ", pygame.Rect(40, 170, 50, 30), "Arial", 16)
 
         btn_dif = ButtonsGroup(
             top=170,
@@ -725,122 +1105,167 @@ class Menu:
         btn_dif.draw()
         ok.draw()
         while True:
-            for ev in pygame.event.get():
+            for ev in self.scheduler.events():
                 if ev.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
                 elif ev.type == pygame.MOUSEBUTTONDOWN:
-                    pos = pygame.mouse.get_pos()
+                    pos = ev.pos
                     if not btn_alg.select(pos):
                         if not btn_juc.select(pos):
                             if not btn_dif.select(pos):
                                 if ok.select(pos):
                                     self.screen.fill((20, 20, 20))  # stergere ecran
-                                    self.game.setAlgorithm(btn_alg.value())
-                                    self.game.setPlayer(btn_juc.value())
+                                    self.context.setAlgorithm(btn_alg.value())
+                                    self.context.setPlayer(btn_juc.value())
+                                    self.context.setDifficulty(btn_dif.value())
                                     self.play()
                                     return
-            pygame.display.update()
 
     def play(self):
         state = State(self.game, 1, MAX_DEPTH)
         state.game.drawBoard()
+        record = RecordWriter(self.recordPath)
+        record.startGame(self.context.dimensions, state.game.getPoisonedIdx(), self.seed)
+
+        btn = ButtonsGroup(
+            top=self.screen.get_height() - self.context.topPadding - 20,
+            left=self.context.leftPadding,
+            buttons=[
+                Button(display=self.screen, w=80, h=30, text="Muta", value="muta"
+                       , backgroundColor=(100, 100, 100)),
+                Button(display=self.screen, w=80, h=30, text="Reincearca", value="r"
+                       , backgroundColor=(100, 100, 100))
+            ]
+        )
+        if self.context.mode == 1 or self.context.mode == 2:
+            btn.draw()
 
         isMoving = None
+        waitKey = self.context.mode == 3  # cvc: one move for every key pressed
+        needHints = True
         while True:
-            if Game.mode == 1 or Game.mode == 2:  # cvp
-                btn = ButtonsGroup(
-                    top=self.screen.get_height() - Game.topPadding - 20,
-                    left=Game.leftPadding,
-                    buttons=[
-                        Button(display=self.screen, w=80, h=30, text="Muta", value="muta"
-                               , backgroundColor=(100, 100, 100)),
-                        Button(display=self.screen, w=80, h=30, text="Reincearca", value="r"
-                               , backgroundColor=(100, 100, 100))
-                    ]
-                )
-
-                btn.draw()
-                pygame.display.flip()
-
-                breakFlag = False
-                while not breakFlag:
-                    if (state.currentPlayer == Game.JMIN and Game.mode == 1)\
-                            or Game.mode == 2: # pvp muta mereu player nu calc
-                        for ev in pygame.event.get():
-                            if ev.type == pygame.QUIT:
-                                pygame.quit()
-                                sys.exit()
-                            elif ev.type == pygame.MOUSEBUTTONDOWN:
-                                pos = pygame.mouse.get_pos()
-
-                                if btn.select(pos):
-                                    if btn.value() == "r":
-                                        state.game.marked = []
+            if self.computerTurn(state) and not waitKey and not self.scheduler.working():
+                self.scheduler.start(self.think, state)
+            elif needHints and not self.computerTurn(state):
+                self.scheduler.startHints(multi_pv, state.game.copy(), MAX_DEPTH, HINT_COUNT)
+            needHints = False
+
+            for ev in self.scheduler.events():
+                if ev.type == pygame.QUIT:
+                    self.scheduler.cancelHints()
+                    record.close()
+                    pygame.quit()
+                    sys.exit()
+                elif ev.type == HINTS_READY:
+                    state.game.drawHints(ev.depth, ev.lines)
+                elif ev.type == ENGINE_DONE:
+                    state.game = ev.result.move.game
+                    state.possibleMoves = []
+                    record.move(state.game.lastMove)
+
+                    state.game.drawBoard()
+                    state.currentPlayer = Game.otherPlayer(state.currentPlayer)
+                    state.game.currentPlayer = state.currentPlayer
+                    if state.game.isFinal():
+                        record.endGame(state.game.isFinal())
+                        record.close()
+                        state.game.finalScreen()
+                        return
+                    waitKey = self.context.mode == 3
+                    needHints = True
+                elif ev.type == ENGINE_FAILED:
+                    # no retry on its own, the same error would come back at once
+                    print(f"The engine failed: {ev.error!r}")
+                    state.game.drawMessage(f"The engine failed ({ev.error}), press any key to try again")
+                    waitKey = True
+                elif ev.type == pygame.KEYDOWN and waitKey:
+                    if self.context.mode != 3:
+                        state.game.drawMessage("")
+                    waitKey = False
+                elif ev.type == pygame.MOUSEBUTTONDOWN and not self.computerTurn(state) and self.context.mode != 3:
+                    pos = ev.pos
+
+                    if btn.select(pos):
+                        if btn.value() == "r":
+                            state.game.marked = []
+                            state.game.drawBoard()
+                            btn.reset()
+                            isMoving = None
+                        elif not state.game.marked:  # nothing to colour, the turn does not pass
+                            btn.reset()
+                        else:
+                            self.scheduler.cancelHints()
+                            state.game.drawHints(0, [])
+                            needHints = True
+                            state.game.colorSelection()
+                            record.move(state.game.lastMove)
+                            state.currentPlayer = Game.otherPlayer(state.currentPlayer)
+                            state.game.currentPlayer = Game.otherPlayer(state.game.currentPlayer)
+                            state.game.drawBoard()
+                            btn.reset()
+                            isMoving = None
+
+                            if state.game.isFinal():
+                                record.endGame(state.game.isFinal())
+                                record.close()
+                                state.game.finalScreen()
+                                return
+                    else:
+                        if isMoving is None:
+                            for np in range(len(state.game.cellGrid)):
+                                if state.game.cellGrid[np].collidepoint(pos):
+                                    aux = state.game.markCell(np)
+                                    if aux == True:
                                         state.game.drawBoard()
-                                        btn.reset()
-                                        isMoving = None
-                                        breakFlag = True
+                                        isMoving = (state.game.cellGrid[np], np)
+                                    else:
+                                        print(aux)
+                                    break
+                        elif isMoving != "finished":
+                            for np in range(len(state.game.cellGrid)):
+                                if state.game.cellGrid[np].collidepoint(pos):
+                                    aux = state.game.makeSelection(isMoving,
+                                                                   (state.game.cellGrid[np], np))
+                                    if aux == True:
+                                        state.game.drawBoard()
+                                        isMoving = "finished"
                                     else:
-                                        state.game.colorSelection()
-                                        state.currentPlayer = Game.otherPlayer(state.currentPlayer)
-                                        state.game.currentPlayer = Game.otherPlayer(state.game.currentPlayer)
-                                        self.screen.fill((20, 20, 20))
+                                        print(aux)
+                                        state.game.marked = []
                                         state.game.drawBoard()
-                                        btn.reset()
                                         isMoving = None
-
-                                        if state.game.isFinal():
-                                            state.game.finalScreen()
-                                            return
-                                        breakFlag = True
-                                else:
-                                    if isMoving is None:
-                                        for np in range(len(state.game.cellGrid)):
-                                            if state.game.cellGrid[np].collidepoint(pos):
-                                                aux = state.game.markCell(np)
-                                                if aux == True:
-                                                    state.game.drawBoard()
-                                                    isMoving = (state.game.cellGrid[np], np)
-                                                else:
-                                                    print(aux)
-                                                break
-                                    elif isMoving != "finished":
-                                        for np in range(len(state.game.cellGrid)):
-                                            if state.game.cellGrid[np].collidepoint(pos):
-                                                aux = state.game.makeSelection(isMoving,
-                                                                               (state.game.cellGrid[np], np))
-                                                if aux == True:
-                                                    state.game.drawBoard()
-                                                    isMoving = "finished"
-                                                else:
-                                                    print(aux)
-                                                    state.game.marked = []
-                                                    state.game.drawBoard()
-                                                    isMoving = None
-                                                breakFlag = True
-                                                break
-                    elif state.currentPlayer == Game.JMAX and Game.mode == 1:
-                        tBefore = int(round(time.time() * 1000))
-                        if state.game.algorithm == "minmax":
-                            newState = min_max(state)
-                        else:
-                            newState = alpha_beta(-500, 500, state)
-                        state.game = newState.game
-
-                        print("Mutare calculator:\n" + str(state))
-                        tAfter = int(round(time.time() * 1000))
-                        print("Calculatorul a \"gandit\" timp de " + str(tAfter - tBefore) + " milisecunde.")
-                        state.game.drawBoard()
-                        if state.game.isFinal():
-                            state.game.finalScreen()
-                            break
-
-                        state.currentPlayer = Game.otherPlayer(state.currentPlayer)
-                        state.game.currentPlayer = Game.otherPlayer(state.currentPlayer)
-                    pygame.display.update()
-
-                pygame.display.update()
+                                    break
+
+    def computerTurn(self, state):
+        return self.context.mode == 3 or (self.context.mode == 1 and state.currentPlayer == self.context.JMAX)
+
+    def think(self, state):
+        # runs on the scheduler thread, the window keeps answering meanwhile
+        if self.context.mode == 3:
+            self.context.setPlayer(Game.otherPlayer(state.currentPlayer))
+        tBefore = int(round(time.time() * 1000))
+        if self.engine is None:
+            newState, depth, stats = search_difficulty(state.game, self.context.difficulty, self.context.algorithm)
+            nodes = stats.nodes
+        else:
+            newState, depth, nodes = self.remoteThink(state)
+        tAfter = int(round(time.time() * 1000))
+        print("Calculatorul a \"gandit\" timp de " + str(tAfter - tBefore) + " milisecunde"
+              + f" (adancime {depth}, {nodes} noduri).")
+        return newState
+
+    def remoteThink(self, state):
+        # the same search done by the engine server, the window is only a client
+        reply = self.engine.search(state.game.dimensions, state.game.cellTable, state.currentPlayer,
+                                   difficulty=self.context.difficulty, algorithm=self.context.algorithm)
+        if reply.get("move") is None:
+            raise RuntimeError(f"the engine server gave no move: {reply}")
+        newState = State(state.game, state.currentPlayer, reply["depth"], score=reply["score"])
+        newState.move = State(state.game.applyMove(tuple(reply["move"]), state.currentPlayer),
+                              Game.otherPlayer(state.currentPlayer), reply["depth"] - 1, parent=newState,
+                              score=reply["score"])
+        return newState, reply["depth"], reply["nodes"]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,86 @@
+"""
+Incrementally maintained legal rectangles.
+
+Every empty rectangle of the starting position gets a bit, numbered in the
+order of a full scan, and every cell knows the mask of the rectangles that
+cover it. Colouring a rectangle removes exactly the rectangles covering its
+cells, and can only make new rectangles legal for the mover: the ones
+covering a cell right next to it (the "next to own colour" rule). Rectangles
+never become illegal otherwise, since coloured cells stay coloured. The
+masks of the cells never change, a move only updates the masks of the
+rectangles still empty and of the legal ones, and undo puts the old ones back.
+"""
+from geometry import geometry
+
+
+class MoveSet:
+    def __init__(self, dimensions, cellTable, players, emptyValue):
+        self.dimensions = dimensions
+        self.geometry = geometry(*dimensions)
+        self.history = []
+        height, width = dimensions
+        self.rects = []
+        self.covering = [0] * (height * width)
+        self.legal = {player: 0 for player in players}
+
+        for top in range(height):
+            for left in range(width):
+                if cellTable[top * width + left] != emptyValue:
+                    continue
+                maxRight = width - 1
+                for bottom in range(top, height):
+                    right = left
+                    while right <= maxRight and cellTable[bottom * width + right] == emptyValue:
+                        right += 1
+                    maxRight = right - 1
+                    if maxRight < left:
+                        break
+                    for right in range(left, maxRight + 1):
+                        self.add((top, left, bottom, right), cellTable)
+        self.empty = (1 << len(self.rects)) - 1
+
+    def add(self, rect, cellTable):
+        bit = 1 << len(self.rects)
+        self.rects.append(rect)
+        for index in self.cells(rect):
+            self.covering[index] |= bit
+        border = self.geometry.touchesBorder(rect)
+        ring = [cellTable[index] for index in self.ring(rect)]
+        for player in self.legal:
+            if border or player in ring:
+                self.legal[player] |= bit
+
+    def cells(self, rect):
+        return self.geometry.rectangle(rect)[0]
+
+    def ring(self, rect):
+        # cells right next to the rectangle, the corners do not count
+        return self.geometry.rectangle(rect)[1]
+
+    def play(self, rect, player):
+        self.history.append((self.empty, dict(self.legal)))
+        covering = self.covering
+        cells, ring = self.geometry.rectangle(rect)
+        removed = 0
+        for index in cells:
+            removed |= covering[index]
+        self.empty &= ~removed
+        for owner in self.legal:
+            self.legal[owner] &= ~removed
+
+        gained = 0
+        for index in ring:
+            gained |= covering[index]
+        self.legal[player] |= gained & self.empty
+
+    def undo(self):
+        self.empty, self.legal = self.history.pop()
+
+    def rectangles(self, player):
+        # in the order of a full scan: top, left, bottom, right
+        mask, rects = self.legal[player], []
+        while mask:
+            low = mask & -mask
+            rects.append(self.rects[low.bit_length() - 1])
+            mask ^= low
+        return rects
@@ -0,0 +1,210 @@
+"""
+Compact binary game records.
+
+A record file is a stream of games. Every game is a header
+    magic "HAPG", version, flags (1: seed given), N, M (1 byte each),
+    O (2 bytes), seed (8 bytes)
+followed by the O poisoned cell indexes (2 bytes each), then one 4 byte
+rectangle (top, left, bottom, right) per move and an end mark
+    255, 255, 255, winner (0 while unknown)
+Players alternate and player 1 starts, so the moves need no player. A game
+cut short (e.g. the window was closed) simply has no end mark.
+
+    python records.py replay games.hap           # replay speed
+    python records.py play 5 6 3 --games 100 -o games.hap --seed 1 --difficulty 1
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+MAGIC = b"HAPG"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBHq")
+CELL = struct.Struct("<H")
+MOVE = struct.Struct("<4B")
+END = 255
+END_MARK = bytes([END, END, END])
+SEEDS = range(-1 << 63, 1 << 63)  # the seed field is a signed 64 bit integer
+
+
+class Rows(dict):
+    # ROWS[width][player][length]: the bytes of a coloured row
+    def __missing__(self, width):
+        rows = self[width] = {player: [bytes([player]) * length for length in range(width + 1)] for player in (1, 2)}
+        return rows
+
+
+ROWS = Rows()
+
+
+class GameRecord:
+    def __init__(self, dimensions, poisoned, seed=None, moves=None, winner=None):
+        self.dimensions = dimensions
+        self.poisoned = tuple(poisoned)
+        self.seed = seed
+        self.moves = [] if moves is None else moves
+        self.winner = winner
+
+    def replay(self, empty=0, poisonedValue=3):
+        # the board after every move, as one bytearray updated in place (copy it to keep one),
+        # players are 1 and 2
+        height, width = self.dimensions
+        board = bytearray([empty]) * (height * width)
+        for index in self.poisoned:
+            board[index] = poisonedValue
+        rows = ROWS[width]
+        player = 1
+        for top, left, bottom, right in self.moves:
+            row = rows[player][right - left + 1]
+            for start in range(top * width + left, bottom * width + left + 1, width):
+                board[start:start + len(row)] = row
+            player = 3 - player
+            yield board
+
+    def __repr__(self):
+        return f"GameRecord({self.dimensions}, {len(self.poisoned)} poisoned, {len(self.moves)} moves, winner {self.winner})"
+
+
+def checkSeed(seed):
+    # a seed the header can hold, else ValueError (better when the settings are read than mid-game)
+    if seed is not None and seed not in SEEDS:
+        raise ValueError(f"seed {seed} does not fit in a game record, it has to be in [-2**63, 2**63)")
+    return seed
+
+
+class RecordWriter:
+    def __init__(self, path):
+        # games are appended, a file keeps growing over sessions. path None records nothing
+        self.file = None if path is None else open(path, "ab")
+        self.inGame = False
+
+    def startGame(self, dimensions, poisoned, seed=None):
+        if self.file is None:
+            return
+        if self.inGame:
+            self.endGame()
+        poisoned = list(poisoned)
+        # a coordinate of 255 would read as the end mark
+        if not 0 < dimensions[0] < END or not 0 < dimensions[1] < END:
+            raise ValueError(f"a {dimensions[0]}x{dimensions[1]} board does not fit in a game record")
+        if len(poisoned) > 0xFFFF:
+            raise ValueError(f"{len(poisoned)} poisoned cells do not fit in a game record")
+        checkSeed(seed)
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed is not None, dimensions[0], dimensions[1],
+                                    len(poisoned), 0 if seed is None else seed))
+        self.file.write(b"".join(CELL.pack(index) for index in poisoned))
+        self.inGame = True
+
+    def move(self, rect):
+        if self.file is not None:
+            self.file.write(MOVE.pack(*rect))
+
+    def endGame(self, winner=None):
+        if self.file is None:
+            return
+        self.file.write(MOVE.pack(END, END, END, winner or 0))
+        self.file.flush()
+        self.inGame = False
+
+    def close(self):
+        if self.file is not None:
+            self.file.flush()
+            self.file.close()
+            self.file = None
+
+
+def parseGames(data):
+    offset, size = 0, len(data)
+    while offset + HEADER.size <= size:
+        magic, version, flags, N, M, O, seed = HEADER.unpack_from(data, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a game record at byte {offset}")
+        offset += HEADER.size
+        poisoned = struct.unpack_from(f"<{O}H", data, offset)
+        offset += CELL.size * O
+
+        # coordinates never reach 255, so the first end mark closes the moves,
+        # unless the next header comes first because this game was cut short
+        end = data.find(END_MARK, offset)
+        end = size if end == -1 else end
+        cut = data.find(MAGIC, offset, end)
+        winner = None
+        if cut != -1 and (cut - offset) % MOVE.size == 0:
+            moves, offset = list(MOVE.iter_unpack(data[offset:cut])), cut
+        else:
+            last = end - (end - offset) % MOVE.size
+            moves = list(MOVE.iter_unpack(data[offset:last]))
+            if end + MOVE.size <= size:
+                winner = data[end + 3] or None
+            offset = end + MOVE.size
+        yield GameRecord((N, M), poisoned, seed if flags & 1 else None, moves, winner)
+
+
+def readGames(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    return parseGames(data)
+
+
+def selfPlay(dimensions, poisoned, games, path, seed=None, difficulty=1):
+    from layouts import layout
+    from main import Context, Game, search_difficulty
+
+    writer = RecordWriter(path)
+    for number in range(games):
+        # every game has its own seed, so its layout can be drawn again from the record
+        gameSeed = None if seed is None else seed + number
+        cells = layout(dimensions, poisoned, gameSeed)
+        cellTable = [Game.emptyCell] * (dimensions[0] * dimensions[1])
+        for index in cells:
+            cellTable[index] = Game.poisonedCell
+        game = Game(Context(None, dimensions, poisoned), cellTable)
+        writer.startGame(dimensions, cells, gameSeed)
+        while not game.isFinal():
+            game.context.setPlayer(Game.otherPlayer(game.currentPlayer))
+            state, depth, stats = search_difficulty(game, difficulty)
+            game = state.move.game
+            writer.move(game.lastMove)
+        writer.endGame(game.isFinal())
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hap game records")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="replay every game of a file")
+    replay.add_argument("path")
+    play = commands.add_parser("play", help="engine against itself, the games are appended to a file")
+    play.add_argument("N", type=int)
+    play.add_argument("M", type=int)
+    play.add_argument("O", type=int)
+    play.add_argument("--games", type=int, default=10)
+    play.add_argument("--seed", type=int, default=None)
+    play.add_argument("--difficulty", type=int, default=1)
+    play.add_argument("-o", "--output", default="games.hap")
+    args = parser.parse_args()
+
+    if args.command == "play":
+        if args.seed is not None:
+            checkSeed(args.seed)
+            checkSeed(args.seed + args.games - 1)  # every game has its own seed
+        tBefore = time.perf_counter()
+        selfPlay((args.N, args.M), args.O, args.games, args.output, args.seed, args.difficulty)
+        print(f"{args.games} games in {time.perf_counter() - tBefore:.2f}s")
+    else:
+        tBefore = time.perf_counter()
+        games = moves = 0
+        for record in readGames(args.path):
+            games += 1
+            for board in record.replay():
+                moves += 1
+        elapsed = time.perf_counter() - tBefore
+        print(f"{games} games, {moves} moves in {elapsed:.2f}s ({moves / max(elapsed, 1e-9):,.0f} moves per second)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Reference Hap engine: the rules and the plain tree search, written to be
+obviously right rather than fast. difftest.py checks every optimised path of
+main.py against it, so it must stay simple: no caches, no incremental state,
+no move ordering. Do not optimise this file.
+
+Boards are lists of N*M cells with the values of main.Game: '.' empty,
+0 poisoned, 1 and 2 the players. Scores are seen by jmax, like estScore.
+"""
+from itertools import combinations
+
+EMPTY, POISONED = '.', 0
+
+
+def other(player):
+    return 2 if player == 1 else 1
+
+
+def neighbours(index, dimensions):
+    height, width = dimensions
+    lin, col = index // width, index % width
+    result = []
+    for dlin, dcol in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        if 0 <= lin + dlin < height and 0 <= col + dcol < width:
+            result.append((lin + dlin) * width + col + dcol)
+    return result
+
+
+def connected(dimensions, cellTable):
+    # the poisoned cells are linked through empty and poisoned cells
+    poisoned = [index for index in range(len(cellTable)) if cellTable[index] == POISONED]
+    if len(poisoned) < 2:
+        return True
+    seen = {poisoned[0]}
+    todo = [poisoned[0]]
+    while todo:
+        index = todo.pop()
+        for neighbour in neighbours(index, dimensions):
+            if neighbour not in seen and cellTable[neighbour] in (EMPTY, POISONED):
+                seen.add(neighbour)
+                todo.append(neighbour)
+    return all(index in seen for index in poisoned)
+
+
+def isLegal(dimensions, cellTable, rect, player):
+    height, width = dimensions
+    top, left, bottom, right = rect
+    cells = [lin * width + col for lin in range(top, bottom + 1) for col in range(left, right + 1)]
+    if any(cellTable[index] != EMPTY for index in cells):
+        return False
+    if top == 0 or left == 0 or bottom == height - 1 or right == width - 1:
+        return True
+    return any(cellTable[neighbour] == player for index in cells for neighbour in neighbours(index, dimensions))
+
+
+def legalRectangles(dimensions, cellTable, player):
+    height, width = dimensions
+    return [(top, left, bottom, right)
+            for top in range(height) for left in range(width)
+            for bottom in range(top, height) for right in range(left, width)
+            if isLegal(dimensions, cellTable, (top, left, bottom, right), player)]
+
+
+def play(dimensions, cellTable, rect, player):
+    width = dimensions[1]
+    top, left, bottom, right = rect
+    board = list(cellTable)
+    for lin in range(top, bottom + 1):
+        for col in range(left, right + 1):
+            board[lin * width + col] = player
+    return board
+
+
+def isFinal(dimensions, cellTable, toMove):
+    # the winner or False; whoever cut the poisoned cells apart lost, so did a player with no move
+    if not connected(dimensions, cellTable):
+        return toMove
+    if not legalRectangles(dimensions, cellTable, toMove):
+        return other(toMove)
+    return False
+
+
+def runEnd(dimensions, cellTable, player, index, direction):
+    # main.Game.getMostX as it always was
+    height, width = dimensions
+    lin, col = index // width, index % width
+    if direction == "up":
+        while lin + 1 < height and cellTable[(lin + 1) * width + col] == player:
+            lin += 1
+        return lin * width + col
+    if direction == "down":
+        while lin - 1 >= 0 and cellTable[(lin - 1) * width + col] == player:
+            lin -= 1
+        return None if lin == 0 else lin * width + col
+    if direction == "left":
+        while col - 1 >= 0 and cellTable[lin * width + col - 1] == player:
+            col -= 1
+        return None if col == 0 else lin * width + col
+    while col + 1 < width and cellTable[lin * width + col + 1] == player:
+        col += 1
+    return None if col == width - 1 else lin * width + col
+
+
+def calcScore(dimensions, cellTable, player):
+    height, width = dimensions
+    borderEmpty = 0
+    for lin in (0, height - 1):
+        for col in range(width - 1):
+            if cellTable[lin * width + col] == EMPTY:
+                borderEmpty += 1
+    used = []
+    for index in range(len(cellTable)):
+        if cellTable[index] == player:
+            for direction in ("up", "down", "left", "right"):
+                end = runEnd(dimensions, cellTable, player, index, direction)
+                if end and end not in used:
+                    used.append(end)
+    return borderEmpty + len(used)
+
+
+def estScore(dimensions, cellTable, toMove, depth, jmax):
+    maxScore = 3 * dimensions[0] * dimensions[1]
+    winner = isFinal(dimensions, cellTable, toMove)
+    if winner == jmax:
+        return maxScore + depth
+    if winner:
+        return -maxScore - depth
+    return calcScore(dimensions, cellTable, jmax) - calcScore(dimensions, cellTable, other(jmax))
+
+
+def min_max(dimensions, cellTable, toMove, depth, jmax):
+    # (score, best rectangle)
+    if depth == 0 or isFinal(dimensions, cellTable, toMove):
+        return estScore(dimensions, cellTable, toMove, depth, jmax), None
+    results = [(min_max(dimensions, play(dimensions, cellTable, rect, toMove), other(toMove), depth - 1, jmax)[0], rect)
+               for rect in legalRectangles(dimensions, cellTable, toMove)]
+    if toMove == jmax:
+        return max(results, key=lambda result: result[0])
+    return min(results, key=lambda result: result[0])
+
+
+def alpha_beta(dimensions, cellTable, toMove, depth, jmax, alpha=float("-inf"), beta=float("inf")):
+    if depth == 0 or isFinal(dimensions, cellTable, toMove):
+        return estScore(dimensions, cellTable, toMove, depth, jmax), None
+    best, bestRect = None, None
+    for rect in legalRectangles(dimensions, cellTable, toMove):
+        score = alpha_beta(dimensions, play(dimensions, cellTable, rect, toMove), other(toMove), depth - 1, jmax,
+                           alpha, beta)[0]
+        if toMove == jmax:
+            if best is None or score > best:
+                best, bestRect = score, rect
+            alpha = max(alpha, score)
+        else:
+            if best is None or score < best:
+                best, bestRect = score, rect
+            beta = min(beta, score)
+        if alpha >= beta:
+            break
+    return best, bestRect
+
+
+def distances(dimensions, cellTable, start, blocked):
+    result = {start: 0}
+    todo = [start]
+    for index in todo:
+        for neighbour in neighbours(index, dimensions):
+            if neighbour not in result and cellTable[neighbour] not in blocked:
+                result[neighbour] = result[index] + 1
+                todo.append(neighbour)
+    return result
+
+
+def steinerSize(dimensions, cellTable, terminals, blocked):
+    # fewest cells of a connected set holding every terminal, 0 when there is none
+    terminals = list(dict.fromkeys(terminals))
+    if len(terminals) < 2:
+        return len(terminals)
+    reach = [distances(dimensions, cellTable, terminal, blocked) for terminal in terminals]
+    if any(terminal not in reach[0] for terminal in terminals):
+        return 0
+    if len(terminals) <= 3:
+        # a tree with at most 3 leaves is paths from one cell to each of them
+        return 1 + min(sum(distance[index] for distance in reach) for index in reach[0])
+
+    # more terminals: every set of open cells of the component, smallest first
+    free = [index for index in sorted(reach[0]) if index not in terminals]
+    for extra in range(len(free) + 1):
+        for cells in combinations(free, extra):
+            chosen = set(terminals) | set(cells)
+            seen, todo = {terminals[0]}, [terminals[0]]
+            while todo:
+                index = todo.pop()
+                for neighbour in neighbours(index, dimensions):
+                    if neighbour in chosen and neighbour not in seen:
+                        seen.add(neighbour)
+                        todo.append(neighbour)
+            if len(seen) == len(chosen):
+                return len(chosen)
+    return 0
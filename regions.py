@@ -0,0 +1,161 @@
+"""
+Independent regions of a Hap position.
+
+The cells which are not coloured (empty or poisoned) make up connected
+regions. A rectangle is empty, so it lies in one region, and it can only make
+cells of that region legal: no cell of another region is next to it. The
+regions are independent games played side by side. A player loses by having
+no move left in any of them, or by cutting the poisoned cells apart, which
+only happens in the region that holds them.
+
+That region is searched move by move. A region without poisoned cells is
+summed up by a cheap analysis of who can move there and how often:
+    private to a player (no border cell, next to that player's colour only):
+        the other player never moves there and the owner can fill it one
+        cell at a time, so it is a reserve of as many spare moves as it has
+        cells. Spare moves of the two players cancel out one for one (the
+        regions are worth integers), only the surplus is kept
+    impartial (every rectangle in it touches the border or both colours, and
+        at most NIM_CELLS cells): both players always have the same moves
+        there, so the region is worth a nimber, found by a search of the
+        region alone (a single cell is worth 1, two of them cancel out).
+        Together the impartial regions are worth the XOR of their nimbers g,
+        and one move to each smaller total is enough to stand for all of them
+    anything else is searched like the poisoned region.
+The search sees the searched regions, the moves to every total below g and
+one spare move for the player with the surplus. Who wins does not change
+(combinatorial game theory), the heuristic score of the leaves does.
+"""
+from geometry import geometry
+
+SEARCHED = "searched"
+IMPARTIAL = "impartial"
+NIM_CELLS = 12  # bigger impartial regions are searched, the nimber search grows with 2 ** cells
+
+
+def mex(values):
+    value = 0
+    while value in values:
+        value += 1
+    return value
+
+
+class Regions:
+    def __init__(self, dimensions, cellTable, players, emptyValue, poisonedValue, cache=None):
+        # cache: an EvalCache keeping the analysis of every region shape, or None
+        self.tables = tables = geometry(*dimensions)
+        self.width = dimensions[1]
+        self.players = players
+        self.region = region = [None] * len(cellTable)
+        self.kinds = []  # SEARCHED, IMPARTIAL or the player the region is private to
+        self.games = {}  # region: (bit of every cell, all its cells, nimbers of its positions) of the impartial ones
+        self.reserve = dict.fromkeys(players, 0)
+        self.nimber = 0
+
+        for start in range(len(cellTable)):
+            if region[start] is not None or (cellTable[start] != emptyValue and cellTable[start] != poisonedValue):
+                continue
+            number = len(self.kinds)
+            region[start] = number
+            cells, poisoned, access, around = [start], False, set(), []
+            for index in cells:  # BFS, the list grows while it is read
+                if cellTable[index] == poisonedValue:
+                    poisoned = True
+                if tables.border[index]:
+                    access.update(players)
+                for neighbour in tables.neighbours[index]:
+                    value = cellTable[neighbour]
+                    if value == emptyValue or value == poisonedValue:
+                        if region[neighbour] is None:
+                            region[neighbour] = number
+                            cells.append(neighbour)
+                    else:
+                        access.add(value)
+                        around.append((neighbour, value))
+
+            if poisoned:
+                self.kinds.append(SEARCHED)
+            elif len(access) == 1:
+                owner = access.pop()
+                self.kinds.append(owner)
+                self.reserve[owner] += len(cells)
+            elif len(cells) > NIM_CELLS:
+                self.kinds.append(SEARCHED)
+            else:
+                cells.sort()
+                key = ("region", tuple(cells), tuple(sorted(around)))
+                game = None if cache is None else cache.get(key)
+                if game is None:
+                    game = self.analyse(cells, cellTable) or ()
+                    if cache is not None:
+                        cache.put(key, game)
+                if game:
+                    self.kinds.append(IMPARTIAL)
+                    self.games[number] = game
+                    self.nimber ^= game[2][game[1]]
+                else:
+                    self.kinds.append(SEARCHED)
+
+    def analyse(self, cells, cellTable):
+        # (bit of every cell, all the cells, nimber of every position reached) when the region is
+        # impartial, else None
+        width = self.width
+        bit = {index: 1 << position for position, index in enumerate(cells)}
+        moves = []
+        for start in cells:
+            top, left = divmod(start, width)
+            maxRight = width - 1
+            bottom = top
+            while bottom * width + left in bit:
+                right = left
+                while right < maxRight and bottom * width + right + 1 in bit:
+                    right += 1
+                maxRight = right
+                for right in range(left, maxRight + 1):
+                    rect = (top, left, bottom, right)
+                    tableCells, ring = self.tables.rectangle(rect)
+                    if not self.tables.touchesBorder(rect) \
+                            and not all(player in [cellTable[index] for index in ring] for player in self.players):
+                        return None  # legal for one player only, now or later
+                    moves.append(sum(bit[index] for index in tableCells))
+                bottom += 1
+
+        nimbers = {}
+
+        def nimber(mask):
+            if mask not in nimbers:
+                nimbers[mask] = mex({nimber(mask ^ move) for move in moves if move & mask == move})
+            return nimbers[mask]
+
+        full = (1 << len(cells)) - 1
+        nimber(full)
+        return bit, full, nimbers
+
+    def kind(self, rect):
+        return self.kinds[self.region[rect[0] * self.width + rect[1]]]
+
+    def split(self, rects, player):
+        # (the rectangles of the searched regions, the moves standing for all the other regions).
+        # When both are empty the smallest rectangle is kept, the player still has to move
+        searched, spare, toNimber = [], None, {}
+        for rect in rects:
+            number = self.region[rect[0] * self.width + rect[1]]
+            kind = self.kinds[number]
+            if kind == SEARCHED:
+                searched.append(rect)
+            elif kind == IMPARTIAL:
+                bit, full, nimbers = self.games[number]
+                mask = full ^ sum(bit[index] for index in self.tables.rectangle(rect)[0])
+                total = self.nimber ^ nimbers[full] ^ nimbers[mask]
+                if total < self.nimber and total not in toNimber:
+                    toNimber[total] = rect
+            elif kind == player and rect[0] == rect[2] and rect[1] == rect[3]:
+                spare = spare or rect
+
+        other = self.players[0] if player == self.players[1] else self.players[1]
+        summary = [toNimber[total] for total in sorted(toNimber)]
+        if spare is not None and self.reserve[player] > self.reserve[other]:
+            summary.append(spare)
+        if not searched and not summary and rects:
+            summary.append(min(rects, key=lambda rect: (rect[2] - rect[0] + 1) * (rect[3] - rect[1] + 1)))
+        return searched, summary
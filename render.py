@@ -0,0 +1,71 @@
+"""
+Drawing helpers for the pygame front end.
+
+Fonts, rendered texts and scaled images are cached. Everything drawn through
+a Renderer is remembered as a dirty rectangle, so flush() only pushes the
+changed parts of the window to the screen.
+"""
+from functools import lru_cache
+
+import pygame
+
+
+@lru_cache(maxsize=None)
+def getFont(name, size):
+    return pygame.font.SysFont(name, size)
+
+
+@lru_cache(maxsize=512)
+def renderText(text, font="arial", fontSize=16, textColor=(255, 255, 255)):
+    return getFont(font, fontSize).render(text, True, textColor)
+
+
+@lru_cache(maxsize=None)
+def scaledImage(path, size):
+    return pygame.transform.scale(pygame.image.load(path), size)
+
+
+class Renderer:
+    def __init__(self, display, background=(20, 20, 20)):
+        self.display = display
+        self.background = background
+        self.dirty = []
+        # what is on the screen right now, e.g. the content of every board cell
+        self.drawn = {}
+
+    def get_width(self):
+        return self.display.get_width()
+
+    def get_height(self):
+        return self.display.get_height()
+
+    def changed(self, key, value):
+        if key in self.drawn and self.drawn[key] == value:
+            return False
+        self.drawn[key] = value
+        return True
+
+    def fill(self, color=None):
+        self.display.fill(self.background if color is None else color)
+        self.drawn = {}
+        self.dirty = [self.display.get_rect()]
+
+    def rect(self, color, rect):
+        pygame.draw.rect(self.display, color, rect)
+        self.dirty.append(pygame.Rect(rect))
+
+    def blit(self, surface, position):
+        self.dirty.append(self.display.blit(surface, position))
+
+    def text(self, text, rect, font="arial", fontSize=16, textColor=(255, 255, 255), background=None):
+        if background is not None:
+            self.rect(background, rect)
+        surface = renderText(text, font, fontSize, textColor)
+        self.blit(surface, surface.get_rect(center=pygame.Rect(rect).center))
+
+    def flush(self):
+        if not self.dirty:
+            return False
+        pygame.display.update(self.dirty)
+        self.dirty = []
+        return True
@@ -0,0 +1,109 @@
+"""
+Main loop scheduling for the pygame front end.
+
+events() blocks on the event queue while nothing is going on, so an idle
+window uses no CPU, and ticks a frame-capped clock while the engine is
+thinking or something is animated. Engine work runs on a background thread
+and its result comes back as an ENGINE_DONE event, or an ENGINE_FAILED
+event with the exception when it raised one. Hints run on a thread of
+their own, every refinement comes back as a HINTS_READY event, and they are
+cancelled as soon as they are not wanted any more.
+
+    python scheduler.py    # measures the CPU use of an idle window
+"""
+import threading
+import time
+
+import pygame
+
+from search import SearchStats
+
+ENGINE_DONE = pygame.event.custom_type()
+ENGINE_FAILED = pygame.event.custom_type()
+HINTS_READY = pygame.event.custom_type()
+
+
+class Scheduler:
+    def __init__(self, renderer, fps=30):
+        self.renderer = renderer
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+        self.animating = False
+        self.job = None
+        self.hints = None  # (thread, stats) of the running analysis
+        self.cpu, self.wall = time.process_time(), time.perf_counter()
+
+    def working(self):
+        return self.job is not None
+
+    def start(self, work, *args):
+        # the job ends when events() hands out its event, on the main thread: cleared here the
+        # window could start the same search again before the event arrives
+        def run():
+            try:
+                event = pygame.event.Event(ENGINE_DONE, result=work(*args))
+            except Exception as error:  # the window has to know, it would wait for the move forever
+                event = pygame.event.Event(ENGINE_FAILED, error=error)
+            pygame.event.post(event)
+
+        self.job = threading.Thread(target=run, daemon=True)
+        self.job.start()
+
+    def startHints(self, analyse, *args):
+        # analyse(*args, stats=, callback=) calls callback(depth, lines) after every depth
+        self.cancelHints()
+        stats = SearchStats()
+
+        def report(depth, lines):
+            if not stats.stopped:
+                pygame.event.post(pygame.event.Event(HINTS_READY, depth=depth, lines=lines, stats=stats))
+
+        thread = threading.Thread(target=analyse, args=args, kwargs={"stats": stats, "callback": report}, daemon=True)
+        self.hints = (thread, stats)
+        thread.start()
+
+    def cancelHints(self):
+        # the analysis stops at its next node; waiting for it keeps it off the engine's caches
+        if self.hints is not None:
+            thread, stats = self.hints
+            stats.stopped = True
+            thread.join()
+            self.hints = None
+
+    def events(self):
+        # events of the next frame, after the changes of the last one are on the screen
+        self.renderer.flush()
+        if self.working() or self.animating:
+            self.clock.tick(self.fps)
+            events = pygame.event.get()
+        else:
+            events = [pygame.event.wait()] + pygame.event.get()
+        if any(ev.type == ENGINE_DONE or ev.type == ENGINE_FAILED for ev in events):
+            self.job = None
+        # hints already queued when their analysis was cancelled are about an old position
+        current = None if self.hints is None else self.hints[1]
+        return [ev for ev in events if ev.type != HINTS_READY or ev.stats is current]
+
+    def cpuUsage(self):
+        # share of one core used since the last call
+        cpu, wall = time.process_time(), time.perf_counter()
+        usage = (cpu - self.cpu) / max(wall - self.wall, 1e-9)
+        self.cpu, self.wall = cpu, wall
+        return usage
+
+
+if __name__ == '__main__':
+    from render import Renderer
+
+    pygame.init()
+    scheduler = Scheduler(Renderer(pygame.display.set_mode((400, 300))))
+    stop = pygame.event.custom_type()
+    pygame.time.set_timer(stop, 3000, loops=1)
+    scheduler.cpuUsage()
+    running = True
+    while running:
+        for ev in scheduler.events():
+            if ev.type == stop or ev.type == pygame.QUIT:
+                running = False
+    print(f"Idle window used {scheduler.cpuUsage() * 100:.1f}% of a core")
+    pygame.quit()
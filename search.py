@@ -0,0 +1,219 @@
+"""
+Negamax with alpha-beta, shared by the Hap (main.py) and 4 in line (x0.py) engines.
+
+A game plugs in by implementing, on the position object:
+    legalMoves(depth)   moves of the player to move (depth is the remaining depth)
+    makeMove(move)      play a move in place
+    unmakeMove()        take the last move back
+    positionHash()      hash of the position, side to move included
+    terminal()          True when the game is over
+    evaluate(depth)     score seen by the player to move
+and optionally, for null-move pruning:
+    makeNullMove()      the player to move passes
+    unmakeNullMove()    takes the pass back
+
+Scores are always from the point of view of the player to move, so one
+search serves both sides. Transposition table and move ordering are hooks.
+
+Two selective extensions are off unless asked for. Late move reductions
+search the moves after the first few (the ones the ordering likes least)
+shallower, and search a move again at full depth when it beats alpha.
+Null-move pruning lets the player to move pass: when even then the opponent
+cannot get below beta in a shallower search, the position fails high. A
+game where passing can be better than any move (zugzwang, which Hap has)
+makes that unsound, so by default a fail high is verified by a real search,
+also shallower.
+"""
+import time
+
+INF = float("inf")
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# moves: searched at full depth before reducing, depth: smallest remaining depth that is reduced
+LMR = {"moves": 3, "depth": 3, "reduction": 1}
+# depth: smallest remaining depth that tries a pass, verify: confirm a fail high with a real search
+NULL_MOVE = {"reduction": 2, "depth": 3, "verify": True}
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchStats:
+    def __init__(self, timeLimit=None, nodeLimit=None):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.ttHits = 0
+        self.researches = 0  # reduced moves searched again at full depth
+        self.nullCutoffs = 0
+        self.nodeLimit = nodeLimit
+        self.deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+        self.limited = True
+        # set from another thread to abandon the search
+        self.stopped = False
+
+    def visit(self):
+        self.nodes += 1
+        if self.stopped:
+            raise SearchTimeout()
+        if not self.limited:
+            return
+        if self.nodeLimit is not None and self.nodes > self.nodeLimit:
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes % 64 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+
+class TranspositionTable:
+    def __init__(self, maxsize=1 << 20, backing=None):
+        # backing: a slower second level with the same probe/store, e.g. store.PositionStore
+        self.maxsize = maxsize
+        self.entries = {}
+        self.backing = backing
+
+    def probe(self, key):
+        # (depth, flag, score, move) or None
+        entry = self.entries.get(key)
+        if entry is None and self.backing is not None:
+            entry = self.backing.probe(key)
+            if entry is not None:
+                self.add(key, entry)
+        return entry
+
+    def add(self, key, entry):
+        if key not in self.entries and len(self.entries) >= self.maxsize:
+            del self.entries[next(iter(self.entries))]  # oldest entry
+        self.entries[key] = entry
+
+    def store(self, key, depth, flag, score, move):
+        self.add(key, (depth, flag, score, move))
+        if self.backing is not None:
+            self.backing.store(key, depth, flag, score, move)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def ttMoveFirst(game, moves, ttMove):
+    if ttMove is not None and ttMove in moves:
+        moves.remove(ttMove)
+        moves.insert(0, ttMove)
+    return moves
+
+
+class Search:
+    def __init__(self, game, stats=None, tt=None, order=ttMoveFirst, pruning=True, lmr=None, nullMove=None):
+        # lmr, nullMove: None (off) or settings like LMR and NULL_MOVE, both need pruning
+        self.game = game
+        self.stats = SearchStats() if stats is None else stats
+        self.tt = tt
+        self.order = order
+        self.pruning = pruning
+        self.lmr = lmr if pruning else None
+        self.nullMove = nullMove if pruning and hasattr(game, "makeNullMove") else None
+
+    def negamax(self, depth, alpha=-INF, beta=INF, nullAllowed=True):
+        # (score, best move) of the position, best move is None in a leaf
+        game = self.game
+        self.stats.visit()
+        if depth == 0 or game.terminal():
+            return game.evaluate(depth), None
+
+        ttMove = None
+        if self.tt is not None:
+            key = game.positionHash()
+            entry = self.tt.probe(key)
+            if entry is not None:
+                entryDepth, flag, score, ttMove = entry
+                # scores depend on the remaining depth, so only an equal depth is reused
+                if entryDepth == depth and (flag == EXACT or (flag == LOWER and score >= beta)
+                                            or (flag == UPPER and score <= alpha)):
+                    self.stats.ttHits += 1
+                    return score, ttMove
+
+        nullMove = self.nullMove
+        if nullMove is not None and nullAllowed and depth >= nullMove["depth"] and beta < INF:
+            reduced = max(depth - 1 - nullMove["reduction"], 0)
+            game.makeNullMove()
+            try:
+                score = -self.negamax(reduced, -beta, -alpha, False)[0]
+            finally:
+                game.unmakeNullMove()
+            if score >= beta:
+                move = ttMove
+                if nullMove["verify"]:
+                    score, move = self.negamax(depth - nullMove["reduction"], alpha, beta, False)
+                if score >= beta:
+                    self.stats.nullCutoffs += 1
+                    return score, move
+
+        moves = game.legalMoves(depth)
+        if not moves:
+            return game.evaluate(depth), None
+        if self.order is not None:
+            moves = self.order(game, moves, ttMove)
+
+        lmr = self.lmr
+        lateMoves = INF if lmr is None or depth < lmr["depth"] else lmr["moves"]
+        alphaStart = alpha
+        best, bestMove = -INF, None
+        for index, move in enumerate(moves):
+            game.makeMove(move)
+            try:
+                if index >= lateMoves and alpha > -INF:
+                    score = -self.negamax(max(depth - 1 - lmr["reduction"], 0), -beta, -alpha)[0]
+                    if score > alpha:
+                        self.stats.researches += 1
+                        score = -self.negamax(depth - 1, -beta, -alpha)[0]
+                else:
+                    score = -self.negamax(depth - 1, -beta, -alpha)[0]
+            finally:
+                game.unmakeMove()
+            if score > best:
+                best, bestMove = score, move
+            if self.pruning:
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    self.stats.cutoffs += 1
+                    break
+
+        if self.tt is not None:
+            if not self.pruning:
+                flag = EXACT
+            elif best <= alphaStart:
+                flag = UPPER
+            elif best >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self.tt.store(key, depth, flag, best, bestMove)
+        return best, bestMove
+
+    def multiPV(self, depth, count, preferred=()):
+        # the count best root moves with their exact scores, best first, in one search:
+        # a move only has to beat the current count-th best line to be searched exactly.
+        # preferred moves (e.g. the lines of the last depth) are searched first
+        game = self.game
+        self.stats.visit()
+        if depth == 0 or game.terminal():
+            return []
+        moves = game.legalMoves(depth)
+        preferred = [move for move in preferred if move in moves]
+        moves = preferred + [move for move in moves if move not in preferred]
+
+        lines = []
+        for move in moves:
+            alpha = lines[-1][0] if len(lines) == count else -INF
+            game.makeMove(move)
+            try:
+                score = -self.negamax(depth - 1, -INF, -alpha)[0]
+            finally:
+                game.unmakeMove()
+            if len(lines) < count or score > alpha:
+                lines.append((score, move))
+                lines.sort(key=lambda line: line[0], reverse=True)
+                del lines[count:]
+        if self.tt is not None and lines:
+            self.tt.store(game.positionHash(), depth, EXACT, lines[0][0], lines[0][1])
+        return lines
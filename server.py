@@ -0,0 +1,415 @@
+"""
+Local engine server: many games at once on a fixed pool of worker processes.
+
+Clients connect over TCP on localhost (or a Unix socket) and send one JSON
+request per line:
+    {"id": 1, "op": "search", "N": 4, "M": 5, "board": ".0.../.....", "player": 1, "time": 1.0}
+    {"id": 1, "op": "cancel"}
+    {"id": 2, "op": "stats"}
+The board is written as in batch.py. A search may also give "depth",
+"nodes", "policy", "regions", "algorithm" and "difficulty" (the budget of a GUI level,
+the other fields override it). The time budget counts from the arrival of
+the request, the time spent in the queue is taken off the search.
+
+Every search gets exactly one reply with its id:
+    {"id": 1, "move": [0, 1, 0, 3], "score": 12, "depth": 4, "nodes": 5321, "wait": 0.001, "time": 0.93}
+with "final" (the winner) instead of a move when the game is over, "error"
+for a bad request and "cancelled": true when it was cancelled; a running
+search then answers with the deepest move it completed, or none. "stats"
+answers with the queue depth, the busy workers and the latency percentiles.
+
+    python server.py --port 8765 --workers 4 --store cache --report 10
+    python server.py --unix /tmp/hap.sock
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Pipe, Process, Value
+from multiprocessing.connection import wait
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from batch import boardText, checkPosition
+from main import DIFFICULTY, MAX_DEPTH, MOVE_POLICIES, Context, Game, iterative_deepening
+from search import SearchStats
+from store import StoreFolder
+
+HOST, PORT = "127.0.0.1", 8765
+POLL = 0.01  # seconds between two checks of a worker for a cancelled search
+
+
+def budgetOf(request):
+    budget = {"depth": MAX_DEPTH, "nodes": None, "time": None, "width": None, "policy": "all", "regions": False,
+              "algorithm": "alphabeta"}
+    if "difficulty" in request:
+        if request["difficulty"] not in DIFFICULTY:
+            raise ValueError(f"unknown difficulty {request['difficulty']}")
+        budget.update(DIFFICULTY[request["difficulty"]])
+    budget.update((key, request[key]) for key in ("depth", "nodes", "time", "policy", "regions", "algorithm") if key in request)
+    if budget["policy"] not in MOVE_POLICIES:
+        raise ValueError(f"unknown move policy {budget['policy']}")
+    if budget["algorithm"] not in ("alphabeta", "minmax"):
+        raise ValueError(f"unknown algorithm {budget['algorithm']}")
+    return budget
+
+
+def searchPosition(position, budget, stats, stores):
+    # stores: the store.StoreFolder of the worker or None
+    dimensions = (position["N"], position["M"])
+    context = Context(None, dimensions, position["cellTable"].count(Game.poisonedCell))
+    context.setStore(stores)
+    context.setMovePolicy(budget["policy"])
+    context.setSelective(budget["width"] is not None, candidateWidthDefault=budget["width"])
+    context.setRegions(bool(budget["regions"]))
+    game = Game(context, position["cellTable"])
+    game.currentPlayer = position.get("player", Game.player1)
+    context.setPlayer(Game.otherPlayer(game.currentPlayer))
+
+    winner = game.isFinal()
+    if winner:
+        return {"final": winner, "move": None, "score": None, "depth": 0, "nodes": 0}
+    state, depth, stats = iterative_deepening(game, budget["depth"], algorithm=budget["algorithm"], stats=stats)
+    move = state.move.game.lastMove if state is not None and state.move is not None else None
+    return {"move": move, "score": None if state is None else state.score, "depth": depth, "nodes": stats.nodes}
+
+
+def work(conn, cancelled, storeDir):
+    # a worker process: one search at a time, None stops it.
+    # A search is stopped when the server writes its number into cancelled
+    current = None  # (number, stats) of the running search
+    stores = None if storeDir is None else StoreFolder(storeDir)
+
+    def watch():
+        while True:
+            time.sleep(POLL)
+            running = current
+            if running is not None and cancelled.value == running[0]:
+                running[1].stopped = True
+
+    threading.Thread(target=watch, daemon=True).start()
+    while True:
+        task = conn.recv()
+        if task is None:
+            if stores is not None:
+                stores.close()
+            break
+        number, position, budget, timeLimit = task
+        stats = SearchStats(timeLimit, budget["nodes"])
+        current = (number, stats)
+        try:
+            result = searchPosition(position, budget, stats, stores)
+        except Exception as error:  # the server has to answer anyway
+            result = {"error": f"{type(error).__name__}: {error}"}
+        current = None
+        conn.send((number, result))
+
+
+class Job:
+    def __init__(self, client, requestId, position, budget):
+        self.client = client
+        self.requestId = requestId
+        self.position = position
+        self.budget = budget
+        self.number = None
+        self.arrived = time.perf_counter()
+        self.started = None
+        self.cancelled = False
+
+
+class Worker:
+    def __init__(self, storeDir):
+        self.conn, child = Pipe()
+        self.cancelled = Value('q', 0, lock=False)
+        self.process = Process(target=work, args=(child, self.cancelled, storeDir), daemon=True)
+        self.process.start()
+        self.job = None
+
+
+def percentiles(values):
+    # milliseconds
+    values = sorted(values)
+    if not values:
+        return {}
+    return {name: round(values[round(p * (len(values) - 1))] * 1000, 1)
+            for name, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}
+
+
+class EngineServer:
+    def __init__(self, workers=None, storeDir=None):
+        self.storeDir = storeDir
+        self.workers = [Worker(storeDir) for _ in range(workers or os.cpu_count() or 1)]
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.numbers = itertools.count(1)
+        self.done = self.cancelledCount = 0
+        self.latencies = deque(maxlen=1000)  # seconds from the arrival of a search to its reply
+        self.waits = deque(maxlen=1000)  # seconds in the queue
+        self.running = True
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def submit(self, client, request):
+        requestId = request.get("id")
+        try:
+            budget = budgetOf(request)
+            position = checkPosition({key: request[key] for key in ("N", "M", "board", "player") if key in request})
+        except (ValueError, KeyError, TypeError) as error:
+            client.reply({"id": requestId, "error": f"bad request: {error}"})
+            return
+        job = Job(client, requestId, position, budget)
+        with self.lock:
+            job.number = next(self.numbers)
+            self.queue.append(job)
+            self.dispatch()
+
+    def dispatch(self):
+        # with the lock held: the idle workers take the oldest jobs
+        for worker in self.workers:
+            if not self.queue:
+                break
+            if worker.job is not None:
+                continue
+            job = self.queue.popleft()
+            job.started = time.perf_counter()
+            timeLimit = job.budget["time"]
+            if timeLimit is not None:
+                timeLimit = max(timeLimit - (job.started - job.arrived), 0.0)
+            worker.job = job
+            worker.conn.send((job.number, job.position, job.budget, timeLimit))
+
+    def cancel(self, client, requestId, reply=True):
+        # a search that already has its reply is left alone
+        with self.lock:
+            for job in self.queue:
+                if job.client is client and job.requestId == requestId:
+                    self.queue.remove(job)
+                    self.cancelledCount += 1
+                    if reply:
+                        self.finish(job, {"move": None, "cancelled": True})
+                    return
+            for worker in self.workers:
+                job = worker.job
+                if job is not None and job.client is client and job.requestId == requestId:
+                    job.cancelled = True
+                    worker.cancelled.value = job.number
+
+    def cancelAll(self, client):
+        with self.lock:
+            jobs = [job for job in self.queue if job.client is client]
+            jobs += [worker.job for worker in self.workers if worker.job is not None and worker.job.client is client]
+        for job in jobs:
+            self.cancel(client, job.requestId, reply=False)
+
+    def finish(self, job, result):
+        # with the lock held
+        now = time.perf_counter()
+        reply = {"id": job.requestId}
+        reply.update(result)
+        if job.started is not None:
+            reply["wait"] = round(job.started - job.arrived, 4)
+            self.waits.append(job.started - job.arrived)
+        reply["time"] = round(now - job.arrived, 4)
+        self.latencies.append(now - job.arrived)
+        self.done += 1
+        job.client.reply(reply)
+
+    def collect(self):
+        # answers the searches the workers are done with and hands them the next ones
+        while self.running:
+            workers = {worker.conn: worker for worker in self.workers}
+            for conn in wait(list(workers), timeout=0.5):
+                worker = workers[conn]
+                try:
+                    number, result = conn.recv()
+                except (EOFError, OSError):
+                    number, result = None, {"error": "worker stopped"}
+                with self.lock:
+                    job, worker.job = worker.job, None
+                    if number is None:  # the process died, a new one takes its place
+                        self.workers[self.workers.index(worker)] = Worker(self.storeDir)
+                    if job is not None:
+                        if job.cancelled:
+                            result["cancelled"] = True
+                            self.cancelledCount += 1
+                        self.finish(job, result)
+                    self.dispatch()
+
+    def stats(self):
+        with self.lock:
+            return {"queued": len(self.queue), "running": sum(worker.job is not None for worker in self.workers),
+                    "workers": len(self.workers), "done": self.done, "cancelled": self.cancelledCount,
+                    "latency": percentiles(self.latencies), "wait": percentiles(self.waits)}
+
+    def close(self):
+        self.running = False
+        self.collector.join()
+        for worker in self.workers:
+            worker.conn.send(None)
+        for worker in self.workers:
+            worker.process.join(1.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+class Connection(socketserver.StreamRequestHandler):
+    # one client, its requests are answered in the order the searches end
+    def setup(self):
+        super().setup()
+        self.writeLock = threading.Lock()
+
+    def reply(self, message):
+        with self.writeLock:
+            try:
+                self.wfile.write((json.dumps(message) + "\n").encode())
+            except OSError:
+                pass  # the client is gone, its searches get cancelled
+
+    def handle(self):
+        engine = self.server.engine
+        try:
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request is a JSON object")
+                except ValueError as error:
+                    self.reply({"error": f"bad request: {error}"})
+                    continue
+                op = request.get("op", "search")
+                if op == "search":
+                    engine.submit(self, request)
+                elif op == "cancel":
+                    engine.cancel(self, request.get("id"))
+                elif op == "stats":
+                    self.reply(dict(id=request.get("id"), **engine.stats()))
+                else:
+                    self.reply({"id": request.get("id"), "error": f"unknown op {op}"})
+        except OSError:
+            pass
+        finally:
+            engine.cancelAll(self)
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def parseAddress(text):
+    # "host:port" or "port" for TCP, anything else is the path of a Unix socket
+    host, _, port = text.rpartition(':')
+    if port.isdigit():
+        return host or HOST, int(port)
+    return text
+
+
+def serve(address, workers=None, storeDir=None):
+    engine = EngineServer(workers, storeDir)
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.remove(address)
+        server = UnixServer(address, Connection)
+    else:
+        server = TCPServer(address, Connection)
+    server.engine = engine
+    return server
+
+
+class EngineClient:
+    # blocking client, safe to share between threads
+    def __init__(self, address, timeout=None):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection(address)
+        self.socket.settimeout(timeout)
+        self.file = self.socket.makefile("rb")
+        self.numbers = itertools.count(1)
+        self.writeLock = threading.Lock()
+        self.readLock = threading.Lock()
+        self.replies = {}  # replies read while waiting for another one
+        self.dropped = 0  # replies without an id (to a line the server could not read), nobody waits for them
+
+    def send(self, message):
+        with self.writeLock:
+            self.socket.sendall((json.dumps(message) + "\n").encode())
+
+    def receive(self, requestId):
+        with self.readLock:
+            while requestId not in self.replies:
+                line = self.file.readline()
+                if not line:
+                    raise ConnectionError("the engine server closed the connection")
+                reply = json.loads(line)
+                if reply.get("id") is None:
+                    self.dropped += 1
+                    continue
+                self.replies[reply["id"]] = reply
+            return self.replies.pop(requestId)
+
+    def search(self, dimensions, cellTable, player, requestId=None, **budget):
+        # budget: time, depth, nodes, policy, regions, algorithm or difficulty, as in the requests
+        requestId = next(self.numbers) if requestId is None else requestId
+        self.send(dict(id=requestId, op="search", N=dimensions[0], M=dimensions[1],
+                       board=boardText(dimensions, cellTable), player=player, **budget))
+        return self.receive(requestId)
+
+    def cancel(self, requestId):
+        self.send({"id": requestId, "op": "cancel"})
+
+    def stats(self):
+        requestId = f"stats-{next(self.numbers)}"
+        self.send({"id": requestId, "op": "stats"})
+        return self.receive(requestId)
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hap engine server for many games at once")
+    parser.add_argument("--port", type=int, default=PORT, help=f"TCP port on {HOST}")
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--store", default=None, help="folder of the on-disk position stores")
+    parser.add_argument("--report", type=float, default=None, help="print the queue and latencies every so many seconds")
+    args = parser.parse_args()
+
+    server = serve(args.unix if args.unix else (HOST, args.port), args.workers, args.store)
+    print(f"Engine server on {args.unix or f'{HOST}:{args.port}'} with {len(server.engine.workers)} workers",
+          file=sys.stderr)
+    if args.report:
+        def report():
+            while True:
+                time.sleep(args.report)
+                print(json.dumps(server.engine.stats()), file=sys.stderr)
+
+        threading.Thread(target=report, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.engine.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Random Hap games in bulk, many boards at once with NumPy.
+
+Thousands of games advance in lockstep as one stack of flat boards (cells
+0 empty, 1 and 2 the players, 3 poisoned, as records.py replays them). One
+step does, for every game still running,
+    the poisoned cells are linked: a flood fill through the empty and
+        poisoned cells of all the boards together,
+    the legal rectangles: a rectangle is legal when none of its cells is
+        taken (one matrix product with the cells of every rectangle) and it
+        touches the border or the colour of the player to move (a second
+        product with the cells around every rectangle),
+    the winner as in Game.isFinal: whoever cut the poisoned cells apart
+        lost, so did a player with no rectangle left,
+    a uniformly random legal rectangle, coloured for the player to move.
+Finished games leave the stack, the others go on. --check replays the first
+games with reference.py, move by move, and fails on any difference.
+
+    python simulate.py 5 6 3 --games 100000 --seed 1 --check 200 --baseline 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from geometry import geometry
+from layouts import iterLayouts
+
+EMPTY, PLAYER1, PLAYER2, POISONED = 0, 1, 2, 3
+
+
+class RectangleTables:
+    # every rectangle of a board, with its cells and the cells around it as rows of 0/1 matrices
+    def __init__(self, height, width):
+        self.dimensions = (height, width)
+        tables = geometry(height, width)
+        self.rects = [(top, left, bottom, right)
+                      for top in range(height) for left in range(width)
+                      for bottom in range(top, height) for right in range(left, width)]
+        self.cells = np.zeros((len(self.rects), height * width), dtype=np.float32)
+        self.ring = np.zeros_like(self.cells)
+        for number, rect in enumerate(self.rects):
+            cells, ring = tables.rectangle(rect)
+            self.cells[number, list(cells)] = 1
+            self.ring[number, list(ring)] = 1
+        self.border = np.array([tables.touchesBorder(rect) for rect in self.rects])
+        self.masks = self.cells.astype(bool)
+        # transposed once, the products run every step
+        self.cellsT = np.ascontiguousarray(self.cells.T)
+        self.ringT = np.ascontiguousarray(self.ring.T)
+
+
+@lru_cache(maxsize=None)
+def rectangleTables(height, width):
+    return RectangleTables(height, width)
+
+
+def connected(dimensions, boards):
+    # for every board: are the poisoned cells linked through empty and poisoned cells
+    height, width = dimensions
+    grid = boards.reshape(-1, height, width)
+    passable = (grid == EMPTY) | (grid == POISONED)
+    poisoned = grid == POISONED
+    flat = poisoned.reshape(len(grid), -1)
+    reach = np.zeros_like(flat)
+    games = np.arange(len(grid))
+    first = flat.argmax(axis=1)
+    reach[games, first] = flat[games, first]
+    reach = reach.reshape(grid.shape)
+    while True:
+        grown = reach.copy()
+        grown[:, 1:, :] |= reach[:, :-1, :]
+        grown[:, :-1, :] |= reach[:, 1:, :]
+        grown[:, :, 1:] |= reach[:, :, :-1]
+        grown[:, :, :-1] |= reach[:, :, 1:]
+        grown &= passable
+        if np.array_equal(grown, reach):
+            break
+        reach = grown
+    return ~(poisoned & ~reach).any(axis=(1, 2))
+
+
+def legalRectangles(tables, boards, players):
+    # games x rectangles: which rectangle each player to move may colour
+    taken = (boards != EMPTY).astype(np.float32)
+    own = (boards == players[:, None]).astype(np.float32)
+    return (taken @ tables.cellsT == 0) & (tables.border | (own @ tables.ringT > 0))
+
+
+def simulate(dimensions, boards, players, rng):
+    # plays every board to the end with random legal rectangles; boards: games x cells of the
+    # values above, players: who moves on each board. Returns (winners, lengths in moves, the
+    # rectangle numbers of tables.rects played, move by move, -1 after the end)
+    tables = rectangleTables(*dimensions)
+    boards = np.array(boards, dtype=np.int8)
+    players = np.array(players, dtype=np.int8)
+    count = len(boards)
+    winners = np.zeros(count, dtype=np.int8)
+    lengths = np.zeros(count, dtype=np.int32)
+    history = np.full((boards.shape[1] + 1, count), -1, dtype=np.int32)
+    active = np.arange(count)
+
+    for ply in range(boards.shape[1] + 1):
+        # every move takes at least one cell, so no game lasts longer
+        cut = ~connected(dimensions, boards)
+        legal = legalRectangles(tables, boards, players)
+        stuck = ~cut & ~legal.any(axis=1)
+        done = cut | stuck
+        winners[active[cut]] = players[cut]
+        winners[active[stuck]] = 3 - players[stuck]
+        lengths[active[done]] = ply
+
+        running = ~done
+        active, boards, players, legal = active[running], boards[running], players[running], legal[running]
+        if not len(active):
+            break
+        keys = rng.random(legal.shape, dtype=np.float32)
+        keys[~legal] = -1
+        choice = keys.argmax(axis=1)
+        history[ply, active] = choice
+        boards = np.where(tables.masks[choice], players[:, None], boards)
+        players = 3 - players
+    return winners, lengths, history
+
+
+def startBoards(dimensions, poisoned, games, seed=None):
+    # games x cells: the seeded layouts of layouts.py, player 1 to move
+    boards = np.zeros((games, dimensions[0] * dimensions[1]), dtype=np.int8)
+    for number, cells in enumerate(iterLayouts(dimensions, poisoned, seed, games)):
+        boards[number, list(cells)] = POISONED
+    return boards
+
+
+def randomGames(dimensions, poisoned, games, seed=None, batch=4096):
+    # (start boards, winners, lengths, history) of random games from the start, batch boards at a time
+    rng = np.random.default_rng(seed)
+    boards = startBoards(dimensions, poisoned, games, seed)
+    results = []
+    for start in range(0, games, batch):
+        part = boards[start:start + batch]
+        results.append(simulate(dimensions, part, np.full(len(part), PLAYER1), rng))
+    winners = np.concatenate([result[0] for result in results])
+    lengths = np.concatenate([result[1] for result in results])
+    history = np.concatenate([result[2] for result in results], axis=1)
+    return boards, winners, lengths, history
+
+
+def checkGames(dimensions, boards, winners, history):
+    # replays the games with reference.py; the first difference of every game that has one
+    import reference
+
+    tables = rectangleTables(*dimensions)
+    values = {EMPTY: reference.EMPTY, POISONED: reference.POISONED, PLAYER1: 1, PLAYER2: 2}
+    problems = []
+    for number, board in enumerate(boards):
+        cellTable = [values[value] for value in board.tolist()]
+        player = PLAYER1
+        for ply, move in enumerate(history[:, number].tolist()):
+            verdict = reference.isFinal(dimensions, cellTable, player)
+            if move == -1:
+                if verdict != winners[number]:
+                    problems.append(f"game {number}: winner {winners[number]} after {ply} moves, reference {verdict}")
+                break
+            rect = tables.rects[move]
+            if verdict:
+                problems.append(f"game {number}: reference ended it after {ply} moves, winner {verdict}")
+                break
+            if not reference.isLegal(dimensions, cellTable, rect, player):
+                problems.append(f"game {number}: move {ply} {rect} is not legal for player {player}")
+                break
+            cellTable = reference.play(dimensions, cellTable, rect, player)
+            player = reference.other(player)
+    return problems
+
+
+def baseline(dimensions, poisoned, games, seed=None):
+    # the same random games played one at a time with main.Game, the winners
+    from main import Context, Game
+
+    rng = random.Random(seed)
+    context = Context(None, dimensions, poisoned)
+    winners = []
+    for cells in iterLayouts(dimensions, poisoned, seed, games):
+        cellTable = [Game.emptyCell] * (dimensions[0] * dimensions[1])
+        for index in cells:
+            cellTable[index] = Game.poisonedCell
+        game = Game(context, cellTable)
+        while not game.isFinal():
+            game = game.applyMove(rng.choice(list(game.rectangles(game.currentPlayer))), game.currentPlayer)
+        winners.append(game.isFinal())
+    return winners
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Random Hap games, many boards at once")
+    parser.add_argument("N", type=int)
+    parser.add_argument("M", type=int)
+    parser.add_argument("O", type=int)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=4096, help="boards advanced together")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--check", type=int, default=0, help="games replayed with reference.py")
+    parser.add_argument("--baseline", type=int, default=0, help="games played one at a time with main.Game")
+    args = parser.parse_args()
+    dimensions = (args.N, args.M)
+
+    tBefore = time.perf_counter()
+    boards, winners, lengths, history = randomGames(dimensions, args.O, args.games, args.seed, args.batch)
+    elapsed = time.perf_counter() - tBefore
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / max(elapsed, 1e-9):,.0f} games per second),"
+          f" player 1 won {np.mean(winners == PLAYER1):.1%}, {lengths.mean():.1f} moves per game")
+
+    if args.baseline:
+        tBefore = time.perf_counter()
+        played = baseline(dimensions, args.O, args.baseline, args.seed)
+        elapsed = time.perf_counter() - tBefore
+        print(f"main.Game: {args.baseline} games in {elapsed:.2f}s ({args.baseline / max(elapsed, 1e-9):,.0f} games"
+              f" per second), player 1 won {played.count(PLAYER1) / len(played):.1%}")
+
+    if args.check:
+        checked = min(args.check, args.games)
+        problems = checkGames(dimensions, boards[:checked], winners[:checked], history[:, :checked])
+        for problem in problems:
+            print(problem)
+        print(f"{checked - len(problems)}/{checked} games agree with reference.py")
+        return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Perfect play for 4 in line (x0.py).
+
+Positions are bitboards: every column takes height + 1 bits, the extra bit on
+top keeps the columns apart. A position is the mask of all stones plus the
+stones of the player to move, and the two together are a unique key.
+
+Scores follow the usual convention: positive when the player to move wins,
+the sooner the win the bigger the score, 0 for a draw. The search is a
+null-window negamax narrowed by binary search on the score, with a fixed size
+transposition table of score bounds, only non-losing moves and centre-first
+ordering refined by the number of threats a move creates.
+
+Early in the game a solve can take minutes (about 90k nodes per second), so
+bestMove takes a node budget and raises SolverLimit when it runs out. The
+bounds found so far stay in the table and make the next try cheaper.
+
+    python solver.py 4453 ...    # solves the given column sequences (1 based)
+"""
+import sys
+import time
+from array import array
+
+
+class SolverLimit(Exception):
+    pass
+
+
+class Position:
+    def __init__(self, width=7, height=6):
+        self.width = width
+        self.height = height
+        self.current = 0  # stones of the player to move
+        self.mask = 0
+        self.moves = 0
+
+        column = (1 << height) - 1
+        self.bottomMask = sum(1 << col * (height + 1) for col in range(width))
+        self.boardMask = self.bottomMask * column
+
+    @classmethod
+    def fromMoves(cls, columns, width=7, height=6):
+        position = cls(width, height)
+        for col in columns:
+            if not position.canPlay(col) or position.isWinningMove(col):
+                raise ValueError(f"invalid sequence at column {col}")
+            position.play(col)
+        return position
+
+    def copy(self):
+        position = Position(self.width, self.height)
+        position.current, position.mask, position.moves = self.current, self.mask, self.moves
+        return position
+
+    def key(self):
+        return self.current + self.mask
+
+    def topMask(self, col):
+        return 1 << (self.height - 1 + col * (self.height + 1))
+
+    def columnMask(self, col):
+        return ((1 << self.height) - 1) << col * (self.height + 1)
+
+    def canPlay(self, col):
+        return not self.mask & self.topMask(col)
+
+    def play(self, col):
+        self.playMove((self.mask + (1 << col * (self.height + 1))) & self.columnMask(col))
+
+    def playMove(self, move):
+        self.current ^= self.mask
+        self.mask |= move
+        self.moves += 1
+
+    def isWinningMove(self, col):
+        return bool(self.winningPositions() & self.possible() & self.columnMask(col))
+
+    def canWinNext(self):
+        return bool(self.winningPositions() & self.possible())
+
+    def possible(self):
+        return (self.mask + self.bottomMask) & self.boardMask
+
+    def winningPositions(self):
+        return self.computeWinning(self.current, self.mask)
+
+    def opponentWinningPositions(self):
+        return self.computeWinning(self.current ^ self.mask, self.mask)
+
+    def possibleNonLosingMoves(self):
+        # moves that do not hand the opponent an immediate win, 0 when all of them lose
+        possible = self.possible()
+        threats = self.opponentWinningPositions()
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                return 0  # two threats, one of them stays open
+            possible = forced
+        return possible & ~(threats >> 1)  # never play right below a threat
+
+    def moveScore(self, move):
+        return self.computeWinning(self.current | move, self.mask).bit_count()
+
+    def computeWinning(self, position, mask):
+        # empty cells that would complete 4 in line for the owner of position
+        H = self.height
+        # vertical
+        r = (position << 1) & (position << 2) & (position << 3)
+
+        for shift in (H + 1, H, H + 2):  # horizontal and the two diagonals
+            p = (position << shift) & (position << 2 * shift)
+            r |= p & (position << 3 * shift)
+            r |= p & (position >> shift)
+            p = (position >> shift) & (position >> 2 * shift)
+            r |= p & (position << shift)
+            r |= p & (position >> 3 * shift)
+
+        return r & (self.boardMask ^ mask)
+
+
+class TranspositionTable:
+    # fixed size, one entry per slot, the newest entry wins the slot
+    def __init__(self, size=8388593):
+        self.size = size
+        self.keys = array('Q', bytes(8 * size))
+        self.values = bytearray(size)
+
+    def put(self, key, value):
+        index = key % self.size
+        self.keys[index] = key
+        self.values[index] = value
+
+    def get(self, key):
+        # 0 when the key is not stored
+        index = key % self.size
+        return self.values[index] if self.keys[index] == key else 0
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.values = bytearray(self.size)
+
+
+def half(score):
+    # halves towards zero, like the usual C formulas for the score bounds
+    return -(-score // 2) if score < 0 else score // 2
+
+
+class Solver:
+    def __init__(self, width=7, height=6, table=None):
+        self.width = width
+        self.height = height
+        self.table = TranspositionTable() if table is None else table
+        self.nodes = 0
+        self.nodeLimit = float("inf")  # raises SolverLimit past this value of nodes
+        # centre columns first: 3, 2, 4, 1, 5, 0, 6 on the usual board
+        self.columnOrder = [width // 2 + (1 - 2 * (i % 2)) * (i + 1) // 2 for i in range(width)]
+        self.minScore = -(width * height // 2) + 3
+        self.maxScore = (width * height + 1) // 2 - 3
+
+        empty = Position(width, height)
+        self.columnMasks = [empty.columnMask(col) for col in self.columnOrder]
+        self.computeWinning = empty.computeWinning
+        self.bottomMask, self.boardMask = empty.bottomMask, empty.boardMask
+
+    def negamax(self, current, mask, moves, alpha, beta):
+        # works on the raw bitboards, a Position would cost an object per node
+        self.nodes += 1
+        if self.nodes > self.nodeLimit:
+            raise SolverLimit()
+        cells = self.width * self.height
+        computeWinning = self.computeWinning
+
+        # moves that do not hand the opponent an immediate win
+        possible = (mask + self.bottomMask) & self.boardMask
+        threats = computeWinning(current ^ mask, mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):
+                return -((cells - moves) // 2)
+            possible = forced
+        possible &= ~(threats >> 1)
+        if not possible:
+            return -((cells - moves) // 2)
+        if moves >= cells - 2:
+            return 0
+
+        lower = -((cells - 2 - moves) // 2)
+        if alpha < lower:
+            alpha = lower
+            if alpha >= beta:
+                return alpha
+        upper = (cells - 1 - moves) // 2
+        if beta > upper:
+            beta = upper
+            if alpha >= beta:
+                return beta
+
+        key = current + mask
+        value = self.table.get(key)
+        if value:
+            if value > self.maxScore - self.minScore + 1:
+                lower = value + 2 * self.minScore - self.maxScore - 2
+                if alpha < lower:
+                    alpha = lower
+                    if alpha >= beta:
+                        return alpha
+            else:
+                upper = value + self.minScore - 1
+                if beta > upper:
+                    beta = upper
+                    if alpha >= beta:
+                        return beta
+
+        # centre first, then by the number of threats the move creates (a stable sort keeps the centre order)
+        candidates = []
+        for columnMask in self.columnMasks:
+            move = possible & columnMask
+            if move:
+                candidates.append((-computeWinning(current | move, mask).bit_count(), move))
+        candidates.sort(key=lambda entry: entry[0])
+
+        opponent = current ^ mask
+        for order, move in candidates:
+            score = -self.negamax(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.table.put(key, score + self.maxScore - 2 * self.minScore + 2)
+                return score
+            if score > alpha:
+                alpha = score
+
+        self.table.put(key, alpha - self.minScore + 1)
+        return alpha
+
+    def search(self, position, alpha, beta):
+        return self.negamax(position.current, position.mask, position.moves, alpha, beta)
+
+    def solve(self, position, weak=False):
+        # exact score of the position (weak: only its sign)
+        if position.canWinNext():
+            return (self.width * self.height + 1 - position.moves) // 2
+        low = -((self.width * self.height - position.moves) // 2)
+        high = (self.width * self.height + 1 - position.moves) // 2
+        if weak:
+            low, high = -1, 1
+        while low < high:
+            # null-window tests, first around 0 where most positions are decided
+            middle = low + (high - low) // 2
+            if middle <= 0 and half(low) < middle:
+                middle = half(low)
+            elif middle >= 0 and half(high) > middle:
+                middle = half(high)
+            score = self.search(position, middle, middle + 1)
+            if score <= middle:
+                high = score
+            else:
+                low = score
+        return low
+
+    def analyse(self, position):
+        # score of every playable column, None for full ones
+        scores = [None] * self.width
+        for col in range(self.width):
+            if not position.canPlay(col):
+                continue
+            if position.isWinningMove(col):
+                scores[col] = (self.width * self.height + 1 - position.moves) // 2
+            else:
+                child = position.copy()
+                child.play(col)
+                scores[col] = -self.solve(child)
+        return scores
+
+    def bestMove(self, position, nodeLimit=None):
+        # (column, score) of a best move, the centre columns win ties.
+        # Raises SolverLimit when nodeLimit nodes were not enough
+        self.nodeLimit = float("inf") if nodeLimit is None else self.nodes + nodeLimit
+        try:
+            return self.findBestMove(position)
+        finally:
+            self.nodeLimit = float("inf")
+
+    def findBestMove(self, position):
+        for col in self.columnOrder:
+            if position.canPlay(col) and position.isWinningMove(col):
+                return col, (self.width * self.height + 1 - position.moves) // 2
+        score = self.solve(position)
+        fallback = None
+        for col in self.columnOrder:
+            if not position.canPlay(col):
+                continue
+            child = position.copy()
+            child.play(col)
+            fallback = col if fallback is None else fallback
+            if child.canWinNext():
+                continue
+            # the child is worth at most -score exactly for the moves that keep the value
+            if self.search(child, -score, -score + 1) <= -score:
+                return col, score
+        return fallback, score
+
+
+if __name__ == '__main__':
+    solver = Solver()
+    for line in sys.argv[1:]:
+        position = Position.fromMoves([int(col) - 1 for col in line])
+        tBefore = time.perf_counter()
+        solver.nodes = 0
+        score = solver.solve(position)
+        print(f"{line}: score {score}, {solver.nodes} nodes, {time.perf_counter() - tBefore:.3f}s")
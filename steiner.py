@@ -0,0 +1,151 @@
+"""
+Exact minimum connector of the poisoned cells on the grid (Steiner tree).
+
+Dreyfus-Wagner style DP over subsets of terminals: dp[S][v] is the size (in
+edges) of the smallest tree connecting the terminals of S and the cell v.
+Each subset first merges two smaller trees at the same cell, then the result
+is spread over the grid with a BFS, since every step costs one cell.
+
+The merge step runs 3^k times, so a row dp[S] is kept packed in one big int,
+16 bits per cell, and the element-wise add/min are done on the whole row at
+once with a few int operations. The top bit of every field is a guard bit.
+"""
+import sys
+from array import array
+from collections import deque
+
+from geometry import geometry
+
+FIELD = 16
+INF = (1 << (FIELD - 2)) - 1  # INF + INF still fits below the guard bit
+
+
+def gridNeighbours(index, dimensions):
+    return geometry(*dimensions).neighbours[index]
+
+
+def component(dimensions, cellTable, start, blocked):
+    # open cells reachable from start, in BFS order
+    neighbours = geometry(*dimensions).neighbours
+    cells = [start]
+    seen = {start}
+    for node in cells:
+        for neighbour in neighbours[node]:
+            if neighbour not in seen and cellTable[neighbour] not in blocked:
+                seen.add(neighbour)
+                cells.append(neighbour)
+    return cells
+
+
+def spread(values, adjacency):
+    # relax values over unit edges: merge the sorted start values with the BFS queue
+    order = sorted((v for v in range(len(values)) if values[v] < INF), key=values.__getitem__)
+    q = deque()
+    i = 0
+    while i < len(order) or q:
+        if q and (i == len(order) or values[q[0]] <= values[order[i]]):
+            v = q.popleft()
+        else:
+            v = order[i]
+            i += 1
+        d = values[v] + 1
+        for u in adjacency[v]:
+            if d < values[u]:
+                values[u] = d
+                q.append(u)
+    return values
+
+
+def pack(values):
+    return int.from_bytes(array('H', values).tobytes(), sys.byteorder)
+
+
+def unpack(row, size):
+    return array('H', row.to_bytes(2 * size, sys.byteorder)).tolist()
+
+
+def steinerTree(dimensions, cellTable, terminals, blocked):
+    """Cells of a smallest connected set containing all terminals, [] if there is none."""
+    terminals = list(dict.fromkeys(terminals))
+    if len(terminals) < 2:
+        return terminals
+
+    cells = component(dimensions, cellTable, terminals[0], blocked)
+    position = {cell: v for v, cell in enumerate(cells)}
+    if any(terminal not in position for terminal in terminals):
+        return []
+    neighbours = geometry(*dimensions).neighbours
+    adjacency = [[position[n] for n in neighbours[cell] if n in position] for cell in cells]
+
+    root = position[terminals[-1]]
+    others = [position[terminal] for terminal in terminals[:-1]]
+    full = (1 << len(others)) - 1
+    dp = [None] * (full + 1)
+    packed = [None] * (full + 1)
+    size = len(cells)
+    guard = pack([1 << (FIELD - 1)] * size)
+    infinite = pack([INF] * size)
+
+    for i, terminal in enumerate(others):
+        values = [INF] * size
+        values[terminal] = 0
+        dp[1 << i] = spread(values, adjacency)
+        packed[1 << i] = pack(dp[1 << i])
+
+    for mask in range(1, full + 1):
+        if dp[mask] is not None:
+            continue
+        low = mask & -mask
+        best = infinite
+        sub = (mask - 1) & mask
+        while sub:
+            if sub & low:
+                merged = packed[sub] + packed[mask ^ sub]
+                # guard bit stays set in the fields where best >= merged
+                select = ((best | guard) - merged) & guard
+                select = (select << 1) - (select >> (FIELD - 1))
+                best ^= (best ^ merged) & select
+            sub = (sub - 1) & mask
+        dp[mask] = spread(unpack(best, size), adjacency)
+        packed[mask] = pack(dp[mask])
+
+    # walk back through the table to recover the cells
+    tree = set()
+    stack = [(full, root)]
+    while stack:
+        mask, v = stack.pop()
+        tree.add(v)
+        value = dp[mask][v]
+        if value == 0:
+            continue
+        step = next((u for u in adjacency[v] if dp[mask][u] + 1 == value), None)
+        if step is not None:
+            stack.append((mask, step))
+            continue
+        sub = (mask - 1) & mask
+        while dp[sub][v] + dp[mask ^ sub][v] != value:
+            sub = (sub - 1) & mask
+        stack.append((sub, v))
+        stack.append((mask ^ sub, v))
+
+    return sorted(cells[v] for v in tree)
+
+
+def shortestPath(dimensions, cellTable, start, goal, blocked):
+    """Cells of a shortest path from start to goal, [] if goal can not be reached."""
+    neighbours = geometry(*dimensions).neighbours
+    parent = {start: None}
+    q = deque([start])
+    while q:
+        node = q.popleft()
+        if node == goal:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parent[node]
+            return path[::-1]
+        for neighbour in neighbours[node]:
+            if neighbour not in parent and cellTable[neighbour] not in blocked:
+                parent[neighbour] = node
+                q.append(neighbour)
+    return []
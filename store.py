@@ -0,0 +1,159 @@
+"""
+Searched positions kept on disk, shared between sessions and processes.
+
+The file is a header and a fixed number of 16 byte slots, memory mapped, so
+opening it is cheap and its size never grows. A slot holds the position hash
+XOR-ed with its data and the data itself (best move, score, depth, bound and
+age packed in 64 bits). A slot torn by a concurrent write fails the XOR check
+and reads as a miss, so readers take no lock. One process writes at a time:
+it holds an exclusive lock on the file and the others open it read only.
+
+Slots come in pairs: the first keeps the deepest search, unless it is from an
+older session, the second always takes the newest result.
+"""
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b"HAPSTORE"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI")  # magic, version, session, slots
+SLOT = struct.Struct("<QQ")  # hash ^ data, data
+NO_MOVE = 0xFFFFFFFF
+
+
+def packRectangle(move):
+    if move is None:
+        return NO_MOVE
+    top, left, bottom, right = move
+    return top << 24 | left << 16 | bottom << 8 | right
+
+
+def unpackRectangle(value):
+    if value == NO_MOVE:
+        return None
+    return value >> 24, value >> 16 & 0xFF, value >> 8 & 0xFF, value & 0xFF
+
+
+class PositionStore:
+    def __init__(self, path, slots=1 << 20, minDepth=1, packMove=packRectangle, unpackMove=unpackRectangle):
+        # slots is used when the file is created, an existing file keeps its size
+        self.path = path
+        self.minDepth = minDepth
+        self.packMove = packMove
+        self.unpackMove = unpackMove
+        self.hits = self.misses = self.writes = 0
+        self.map = None
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        self.writer = self.lock()
+        size = os.fstat(self.fd).st_size
+        if self.writer and not self.valid(size):
+            os.ftruncate(self.fd, HEADER.size + SLOT.size * 2 * ((slots + 1) // 2))
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            os.write(self.fd, HEADER.pack(MAGIC, VERSION, 0, 2 * ((slots + 1) // 2)))
+            size = os.fstat(self.fd).st_size
+        elif not self.valid(size):
+            return  # being created by the writer, works as an empty store
+
+        self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_WRITE if self.writer else mmap.ACCESS_READ)
+        magic, version, session, self.slots = HEADER.unpack_from(self.map, 0)
+        self.buckets = self.slots // 2
+        if self.writer:
+            session = (session + 1) & 0xFFFF
+            HEADER.pack_into(self.map, 0, MAGIC, VERSION, session, self.slots)
+        self.age = session & 0x3F
+
+    def lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def valid(self, size):
+        if size < HEADER.size:
+            return False
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        magic, version, session, slots = HEADER.unpack(os.read(self.fd, HEADER.size))
+        return magic == MAGIC and version == VERSION and slots > 0 and size == HEADER.size + SLOT.size * slots
+
+    def offset(self, key, slot):
+        return HEADER.size + SLOT.size * (2 * (key % self.buckets) + slot)
+
+    def probe(self, key):
+        # (depth, flag, score, move) or None, like search.TranspositionTable
+        # both slots can hold the position: the deeper search wins, the newer one (slot 1) on a tie
+        if self.map is None:
+            return None
+        found = None
+        for slot in (0, 1):
+            check, data = SLOT.unpack_from(self.map, self.offset(key, slot))
+            if data and check ^ data == key and (found is None or data >> 8 & 0xFF >= found >> 8 & 0xFF):
+                found = data
+        if found is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (found >> 8 & 0xFF, found >> 6 & 0x3, (found >> 16 & 0xFFFF) - 0x8000, self.unpackMove(found >> 32))
+
+    def store(self, key, depth, flag, score, move):
+        if not self.writer or self.map is None or depth < self.minDepth or depth > 0xFF:
+            return
+        if not -0x8000 <= score < 0x8000 or score != int(score):
+            return  # only the integer scores of the evaluation fit in a slot
+        data = self.packMove(move) << 32 | (int(score) + 0x8000) << 16 | depth << 8 | flag << 6 | self.age
+
+        offset = self.offset(key, 0)
+        check, old = SLOT.unpack_from(self.map, offset)
+        if old and old & 0x3F == self.age and old >> 8 & 0xFF > depth:
+            offset = self.offset(key, 1)  # keep the deeper search of this session, of this position too
+        SLOT.pack_into(self.map, offset, key ^ data, data)
+        self.writes += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitRate": self.hits / total if total else 0.0,
+                "writes": self.writes, "slots": 0 if self.map is None else self.slots, "writer": self.writer}
+
+    def close(self):
+        if self.map is not None:
+            if self.writer:
+                self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)  # also releases the lock
+            self.fd = None
+
+
+class StoreFolder:
+    # the stores of one folder, opened on first use. The games of a process share one folder, so every
+    # file is opened once and keeps its write lock
+    def __init__(self, folder):
+        self.folder = folder
+        self.stores = {}
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.stores:
+                self.stores[name] = PositionStore(os.path.join(self.folder, name))
+            return self.stores[name]
+
+    def close(self):
+        with self.lock:
+            for store in self.stores.values():
+                store.close()
+            self.stores = {}
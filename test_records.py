@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from records import RecordWriter, checkSeed, readGames
+
+
+class SeedTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.path = os.path.join(folder, "games.hap")
+
+    def write(self, seed):
+        writer = RecordWriter(self.path)
+        try:
+            writer.startGame((4, 5), [3, 7], seed)
+            writer.move((0, 0, 0, 0))
+            writer.endGame(1)
+        finally:
+            writer.close()
+
+    def testLargestSeedsRoundTrip(self):
+        for seed in ((1 << 63) - 1, -1 << 63):
+            self.write(seed)
+        self.assertEqual([record.seed for record in readGames(self.path)], [(1 << 63) - 1, -1 << 63])
+
+    def testSeedTooLarge(self):
+        for seed in (1 << 63, -(1 << 63) - 1, 1 << 70):
+            with self.assertRaises(ValueError):
+                checkSeed(seed)
+            with self.assertRaises(ValueError):
+                self.write(seed)
+        self.assertEqual(list(readGames(self.path)), [])  # nothing half written
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
 import time
-import copy
 import pygame
 import sys
 
+from cache import sideKey, zobristKeys
+from geometry import geometry
+from search import Search
+from solver import Position, Solver, SolverLimit
+
 ADANCIME_MAX = 4
 
 
@@ -12,44 +16,73 @@ def elem_identice(lista):
     return False
 
 
+class ContextJoc:
+    """
+    Ce au in comun o partida si toate tablele cautate din ea: dimensiunile, jucatorii, scorul maxim,
+    fereastra si jucatorul perfect. Fiecare partida are contextul ei, deci mai multe partide pot rula
+    in acelasi proces.
+    """
+
+    def __init__(self, NR_LINII=6, NR_COLOANE=7, display=None, dim_celula=100):
+        self.NR_LINII = NR_LINII
+        self.NR_COLOANE = NR_COLOANE
+        self.JMIN = None
+        self.JMAX = None
+        self.solver = None  # jucatorul perfect, tabela lui de transpozitie ramane intre mutari
+
+        ######## calculare scor maxim ###########
+        sc_randuri = (NR_COLOANE - 3) * NR_LINII
+        sc_coloane = (NR_LINII - 3) * NR_COLOANE
+        sc_diagonale = (NR_LINII - 3) * (NR_COLOANE - 3) * 2
+        self.scor_maxim = sc_randuri + sc_coloane + sc_diagonale
+
+        self.display = display
+        self.dim_celula = dim_celula
+        self.celuleGrid = []  # este lista cu patratelele din grid
+        if display is not None:  # fara fereastra cand doar se cauta
+            self.x_img = pygame.image.load('ics.png')
+            self.x_img = pygame.transform.scale(self.x_img, (dim_celula, dim_celula))
+            self.zero_img = pygame.image.load('zero.png')
+            self.zero_img = pygame.transform.scale(self.zero_img, (dim_celula, dim_celula))
+            for linie in range(NR_LINII):
+                for coloana in range(NR_COLOANE):
+                    patr = pygame.Rect(coloana * (dim_celula + 1), linie * (dim_celula + 1), dim_celula, dim_celula)
+                    self.celuleGrid.append(patr)
+
+    def seteaza_jucator(self, jucator):
+        self.JMIN = jucator
+        self.JMAX = Joc.jucator_opus(jucator)
+
+
 class Joc:
     """
     Clasa care defineste jocul. Se va schimba de la un joc la altul.
     """
-    JMIN = None
-    JMAX = None
     GOL = '#'
-    NR_LINII = None
-    NR_COLOANE = None
-    scor_maxim = 0
 
-    def __init__(self, matr=None, NR_LINII=None, NR_COLOANE=None):
+    def __init__(self, context, matr=None):
+        self.context = context
+        self.NR_LINII = context.NR_LINII
+        self.NR_COLOANE = context.NR_COLOANE
         # creez proprietatea ultima_mutare # (l,c)
         self.ultima_mutare = None
+        # folosite de cautarea din search.py, care muta si revine pe aceeasi tabla
+        self.j_curent = None
+        self.istoric = []
+        self.hash = None
 
         if matr:
             # e data tabla, deci suntem in timpul jocului
             self.matr = matr
         else:
             # nu e data tabla deci suntem la initializare
-            self.matr = [[self.__class__.GOL] * NR_COLOANE for i in range(NR_LINII)]
-
-            if NR_LINII is not None:
-                self.__class__.NR_LINII = NR_LINII
-            if NR_COLOANE is not None:
-                self.__class__.NR_COLOANE = NR_COLOANE
-
-            ######## calculare scor maxim ###########
-            sc_randuri = (NR_COLOANE - 3) * NR_LINII
-            sc_coloane = (NR_LINII - 3) * NR_COLOANE
-            sc_diagonale = (NR_LINII - 3) * (NR_COLOANE - 3) * 2
-            self.__class__.scor_maxim = sc_randuri + sc_coloane + sc_diagonale
+            self.matr = [[self.__class__.GOL] * self.NR_COLOANE for i in range(self.NR_LINII)]
 
     def deseneaza_grid(self, coloana_marcaj=None):  # tabla de exemplu este ["#","x","#","0",......]
-
-        for ind in range(self.__class__.NR_COLOANE * self.__class__.NR_LINII):
-            linie = ind // self.__class__.NR_COLOANE  # // inseamna div
-            coloana = ind % self.__class__.NR_COLOANE
+        context = self.context
+        for ind in range(self.NR_COLOANE * self.NR_LINII):
+            linie = ind // self.NR_COLOANE  # // inseamna div
+            coloana = ind % self.NR_COLOANE
 
             if coloana == coloana_marcaj:
                 # daca am o patratica selectata, o desenez cu rosu
@@ -57,43 +90,29 @@ class Joc:
             else:
                 # altfel o desenez cu alb
                 culoare = (255, 255, 255)
-            pygame.draw.rect(self.__class__.display, culoare, self.__class__.celuleGrid[ind])  # alb = (255,255,255)
+            pygame.draw.rect(context.display, culoare, context.celuleGrid[ind])  # alb = (255,255,255)
             if self.matr[linie][coloana] == 'x':
-                self.__class__.display.blit(self.__class__.x_img, (
-                coloana * (self.__class__.dim_celula + 1), linie * (self.__class__.dim_celula + 1)))
+                context.display.blit(context.x_img, (
+                coloana * (context.dim_celula + 1), linie * (context.dim_celula + 1)))
             elif self.matr[linie][coloana] == '0':
-                self.__class__.display.blit(self.__class__.zero_img, (
-                coloana * (self.__class__.dim_celula + 1), linie * (self.__class__.dim_celula + 1)))
+                context.display.blit(context.zero_img, (
+                coloana * (context.dim_celula + 1), linie * (context.dim_celula + 1)))
         # pygame.display.flip()
         pygame.display.update()
 
-    @classmethod
-    def jucator_opus(cls, jucator):
-        return cls.JMAX if jucator == cls.JMIN else cls.JMIN
-
-    @classmethod
-    def initializeaza(cls, display, NR_LINII=6, NR_COLOANE=7, dim_celula=100):
-        cls.display = display
-        cls.dim_celula = dim_celula
-        cls.x_img = pygame.image.load('ics.png')
-        cls.x_img = pygame.transform.scale(cls.x_img, (dim_celula, dim_celula))
-        cls.zero_img = pygame.image.load('zero.png')
-        cls.zero_img = pygame.transform.scale(cls.zero_img, (dim_celula, dim_celula))
-        cls.celuleGrid = []  # este lista cu patratelele din grid
-        for linie in range(NR_LINII):
-            for coloana in range(NR_COLOANE):
-                patr = pygame.Rect(coloana * (dim_celula + 1), linie * (dim_celula + 1), dim_celula, dim_celula)
-                cls.celuleGrid.append(patr)
+    @staticmethod
+    def jucator_opus(jucator):
+        return '0' if jucator == 'x' else 'x'
 
     def parcurgere(self, directie):
+        # celulele din directia data vin gata calculate din geometry.py
+        tabele = geometry(self.NR_LINII, self.NR_COLOANE)
         um = self.ultima_mutare  # (l,c)
         culoare = self.matr[um[0]][um[1]]
         nr_mutari = 0
-        while True:
-            um = (um[0] + directie[0], um[1] + directie[1])
-            if not 0 <= um[0] < self.__class__.NR_LINII or not 0 <= um[1] < self.__class__.NR_COLOANE:
-                break
-            if not self.matr[um[0]][um[1]] == culoare:
+        for index in tabele.rays[um[0] * self.NR_COLOANE + um[1]][tuple(directie)]:
+            linie, coloana = tabele.coordinates[index]
+            if not self.matr[linie][coloana] == culoare:
                 break
             nr_mutari += 1
         return nr_mutari
@@ -116,24 +135,89 @@ class Joc:
         else:
             return False
 
+    def coloane_libere(self):
+        return [j for j in range(self.NR_COLOANE) if self.matr[0][j] == self.__class__.GOL]
+
+    def linie_libera(self, coloana):
+        # cea mai de jos celula goala din coloana
+        linie = self.NR_LINII - 1
+        while self.matr[linie][coloana] != self.__class__.GOL:
+            linie -= 1
+        return linie
+
+    def aplica_mutare(self, coloana, jucator):
+        linie = self.linie_libera(coloana)
+        matr_tabla_noua = [list(rand) for rand in self.matr]
+        matr_tabla_noua[linie][coloana] = jucator
+        jn = Joc(self.context, matr_tabla_noua)
+        jn.ultima_mutare = (linie, coloana)
+        return jn
+
     def mutari(self, jucator):
-        l_mutari = []
-        for j in range(self.__class__.NR_COLOANE):
-            last_poz = None
-            if self.matr[0][j] != self.__class__.GOL:
-                continue
-            for i in range(self.__class__.NR_LINII):
-                if self.matr[i][j] != self.__class__.GOL:
-                    last_poz = (i - 1, j)
+        return [self.aplica_mutare(j, jucator) for j in self.coloane_libere()]
+
+    ######## interfata cautarii comune (search.py) ###########
+    def copie(self, j_curent):
+        jn = Joc(self.context, [list(rand) for rand in self.matr])
+        jn.ultima_mutare = self.ultima_mutare
+        jn.j_curent = j_curent
+        return jn
+
+    def hash_celula(self, linie, coloana, jucator):
+        chei = zobristKeys(self.NR_LINII * self.NR_COLOANE, 2)
+        return chei[linie * self.NR_COLOANE + coloana][0 if jucator == 'x' else 1]
+
+    def getHash(self):
+        if self.hash is None:
+            self.hash = 0
+            for linie, rand in enumerate(self.matr):
+                for coloana, celula in enumerate(rand):
+                    if celula != self.__class__.GOL:
+                        self.hash ^= self.hash_celula(linie, coloana, celula)
+        return self.hash
+
+    def pozitie(self, j_curent):
+        # tabla ca bitboard pentru solver.py, coloana de jos in sus
+        poz = Position(self.NR_COLOANE, self.NR_LINII)
+        for coloana in range(self.NR_COLOANE):
+            for niv in range(self.NR_LINII):
+                celula = self.matr[self.NR_LINII - 1 - niv][coloana]
+                if celula == self.__class__.GOL:
                     break
-            if last_poz is None:
-                last_poz = (self.__class__.NR_LINII - 1, j)
-            matr_tabla_noua = copy.deepcopy(self.matr)
-            matr_tabla_noua[last_poz[0]][last_poz[1]] = jucator
-            jn = Joc(matr_tabla_noua)
-            jn.ultima_mutare = (last_poz[0], last_poz[1])
-            l_mutari.append(jn)
-        return l_mutari
+                bit = 1 << (coloana * (self.NR_LINII + 1) + niv)
+                poz.mask |= bit
+                poz.moves += 1
+                if celula == j_curent:
+                    poz.current |= bit
+        return poz
+
+    def legalMoves(self, depth=None):
+        return self.coloane_libere()
+
+    def makeMove(self, coloana):
+        linie = self.linie_libera(coloana)
+        self.hash = self.getHash() ^ self.hash_celula(linie, coloana, self.j_curent)
+        self.matr[linie][coloana] = self.j_curent
+        self.istoric.append(self.ultima_mutare)
+        self.ultima_mutare = (linie, coloana)
+        self.j_curent = self.jucator_opus(self.j_curent)
+
+    def unmakeMove(self):
+        linie, coloana = self.ultima_mutare
+        self.j_curent = self.jucator_opus(self.j_curent)
+        self.hash ^= self.hash_celula(linie, coloana, self.j_curent)
+        self.matr[linie][coloana] = self.__class__.GOL
+        self.ultima_mutare = self.istoric.pop()
+
+    def positionHash(self):
+        return self.getHash() ^ sideKey(0 if self.j_curent == 'x' else 1)
+
+    def terminal(self):
+        return bool(self.final())
+
+    def evaluate(self, depth):
+        scor = self.estimeaza_scor(depth)
+        return scor if self.j_curent == self.context.JMAX else -scor
 
     # linie deschisa inseamna linie pe care jucatorul mai poate forma o configuratie castigatoare
     # practic e o linie fara simboluri ale jucatorului opus
@@ -146,26 +230,11 @@ class Joc:
         return 0
 
     def linii_deschise(self, jucator):
-
+        # toate segmentele de 4 (randuri, coloane si cele doua diagonale) vin din geometry.py
+        celule = [celula for rand in self.matr for celula in rand]
         linii = 0
-        for i in range(self.__class__.NR_LINII):
-            for j in range(self.__class__.NR_COLOANE - 3):
-                linii += self.linie_deschisa(self.matr[i][j:j + 4], jucator)
-
-        for j in range(self.__class__.NR_COLOANE):
-            for i in range(self.__class__.NR_LINII - 3):
-                linii += self.linie_deschisa([self.matr[k][j] for k in range(i, i + 4)], jucator)
-
-        # \
-        for i in range(self.__class__.NR_LINII - 3):
-            for j in range(self.__class__.NR_COLOANE - 3):
-                linii += self.linie_deschisa([self.matr[i + k][j + k] for k in range(0, 4)], jucator)
-
-        # /
-        for i in range(self.__class__.NR_LINII - 3):
-            for j in range(3, self.__class__.NR_COLOANE):
-                linii += self.linie_deschisa([self.matr[i + k][j - k] for k in range(0, 4)], jucator)
-
+        for linie in geometry(self.NR_LINII, self.NR_COLOANE).lines(4):
+            linii += self.linie_deschisa([celule[index] for index in linie], jucator)
         return linii
 
         """return (self.linie_deschisa(self.matr[0:3],jucator) 
@@ -180,15 +249,16 @@ class Joc:
 
     def estimeaza_scor(self, adancime):
         t_final = self.final()
+        context = self.context
         # if (adancime==0):
-        if t_final == self.__class__.JMAX:
-            return (self.__class__.scor_maxim + adancime)
-        elif t_final == self.__class__.JMIN:
-            return (-self.__class__.scor_maxim - adancime)
+        if t_final == context.JMAX:
+            return (context.scor_maxim + adancime)
+        elif t_final == context.JMIN:
+            return (-context.scor_maxim - adancime)
         elif t_final == 'remiza':
             return 0
         else:
-            return (self.linii_deschise(self.__class__.JMAX) - self.linii_deschise(self.__class__.JMIN))
+            return (self.linii_deschise(context.JMAX) - self.linii_deschise(context.JMIN))
 
     def sirAfisare(self):
         sir = "  |"
@@ -208,7 +278,7 @@ class Stare:
     """
     Clasa folosita de algoritmii minimax si alpha-beta
     Are ca proprietate tabla de joc
-    Functioneaza cu conditia ca in cadrul clasei Joc sa fie definiti JMIN si JMAX (cei doi jucatori posibili)
+    Functioneaza cu conditia ca in contextul tablei sa fie definiti JMIN si JMAX (cei doi jucatori posibili)
     De asemenea cere ca in clasa Joc sa fie definita si o metoda numita mutari() care ofera lista cu configuratiile posibile in urma mutarii unui jucator
     """
 
@@ -244,72 +314,50 @@ class Stare:
         return sir
 
 
-""" Algoritmul MinMax """
-
+""" Algoritmii MinMax si alpha-beta, amandoi prin negamax-ul din search.py """
 
-def min_max(stare):
-    if stare.adancime == 0 or stare.tabla_joc.final():
-        stare.scor = stare.tabla_joc.estimeaza_scor(stare.adancime)
-        return stare
 
-    # calculez toate mutarile posibile din starea curenta
-    stare.mutari_posibile = stare.mutari()
+def cauta(stare, alpha, beta, pruning=True, stats=None, tt=None):
+    # negamax da scorul din perspectiva jucatorului la mutare, aici il intorc in perspectiva lui JMAX
+    joc = stare.tabla_joc.copie(stare.j_curent)
+    semn = 1 if stare.j_curent == stare.tabla_joc.context.JMAX else -1
+    fereastra = (alpha, beta) if semn == 1 else (-beta, -alpha)
+    scor, coloana = Search(joc, stats, tt, pruning=pruning).negamax(stare.adancime, *fereastra)
 
-    # aplic algoritmul minimax pe toate mutarile posibile (calculand astfel subarborii lor)
-    mutari_scor = [min_max(mutare) for mutare in stare.mutari_posibile]
-
-    if stare.j_curent == Joc.JMAX:
-        # daca jucatorul e JMAX aleg starea-fiica cu scorul maxim
-        stare.stare_aleasa = max(mutari_scor, key=lambda x: x.scor)
-    else:
-        # daca jucatorul e JMIN aleg starea-fiica cu scorul minim
-        stare.stare_aleasa = min(mutari_scor, key=lambda x: x.scor)
-    stare.scor = stare.stare_aleasa.scor
+    stare.scor = semn * scor
+    if coloana is not None:
+        stare.stare_aleasa = Stare(stare.tabla_joc.aplica_mutare(coloana, stare.j_curent),
+                                   Joc.jucator_opus(stare.j_curent), stare.adancime - 1, parinte=stare, scor=stare.scor)
     return stare
 
 
-def alpha_beta(alpha, beta, stare):
-    if stare.adancime == 0 or stare.tabla_joc.final():
-        stare.scor = stare.tabla_joc.estimeaza_scor(stare.adancime)
-        return stare
-
-    if alpha > beta:
-        return stare  # este intr-un interval invalid deci nu o mai procesez
+def min_max(stare, stats=None, tt=None):
+    return cauta(stare, float('-inf'), float('inf'), pruning=False, stats=stats, tt=tt)
 
-    stare.mutari_posibile = stare.mutari()
 
-    if stare.j_curent == Joc.JMAX:
-        scor_curent = float('-inf')
+def alpha_beta(alpha, beta, stare, stats=None, tt=None):
+    return cauta(stare, alpha, beta, stats=stats, tt=tt)
 
-        for mutare in stare.mutari_posibile:
-            # calculeaza scorul
-            stare_noua = alpha_beta(alpha, beta, mutare)
-
-            if (scor_curent < stare_noua.scor):
-                stare.stare_aleasa = stare_noua
-                scor_curent = stare_noua.scor
-            if (alpha < stare_noua.scor):
-                alpha = stare_noua.scor
-                if alpha >= beta:
-                    break
 
-    elif stare.j_curent == Joc.JMIN:
-        scor_curent = float('inf')
+# noduri pe care solver-ul le poate cauta la o mutare, cam o secunda (~90k noduri pe secunda)
+NODURI_PERFECT = 100000
 
-        for mutare in stare.mutari_posibile:
 
-            stare_noua = alpha_beta(alpha, beta, mutare)
-
-            if (scor_curent > stare_noua.scor):
-                stare.stare_aleasa = stare_noua
-                scor_curent = stare_noua.scor
-
-            if (beta > stare_noua.scor):
-                beta = stare_noua.scor
-                if alpha >= beta:
-                    break
-    stare.scor = stare.stare_aleasa.scor
+def perfect(stare):
+    # joc perfect, scorul e pozitiv daca jucatorul curent castiga (mai mare pentru un castig mai rapid).
+    # La inceputul partidei rezolvarea poate dura minute: cand nu ajung NODURI_PERFECT se muta cu
+    # alpha-beta la adancimea starii, ce a aflat solver-ul ramane in tabela pentru mutarile urmatoare
+    context = stare.tabla_joc.context
+    if context.solver is None:
+        context.solver = Solver(context.NR_COLOANE, context.NR_LINII)
+    try:
+        coloana, scor = context.solver.bestMove(stare.tabla_joc.pozitie(stare.j_curent), NODURI_PERFECT)
+    except SolverLimit:
+        return alpha_beta(-500, 500, stare)
 
+    stare.scor = scor if stare.j_curent == context.JMAX else -scor
+    stare.stare_aleasa = Stare(stare.tabla_joc.aplica_mutare(coloana, stare.j_curent),
+                               Joc.jucator_opus(stare.j_curent), stare.adancime - 1, parinte=stare, scor=stare.scor)
     return stare
 
 
@@ -407,7 +455,8 @@ def deseneaza_alegeri(display, tabla_curenta):
         left=30,
         listaButoane=[
             Buton(display=display, w=80, h=30, text="minimax", valoare="minimax"),
-            Buton(display=display, w=80, h=30, text="alphabeta", valoare="alphabeta")
+            Buton(display=display, w=80, h=30, text="alphabeta", valoare="alphabeta"),
+            Buton(display=display, w=80, h=30, text="perfect", valoare="perfect")
         ],
         indiceSelectat=1)
     btn_juc = GrupButoane(
@@ -447,14 +496,14 @@ def main():
     nc = 7
     w = 50
     ecran = pygame.display.set_mode(size=(nc * (w + 1) - 1, nl * (w + 1) - 1))  # N *w+ N-1= N*(w+1)-1
-    Joc.initializeaza(ecran, NR_LINII=nl, NR_COLOANE=nc, dim_celula=w)
+    context = ContextJoc(NR_LINII=nl, NR_COLOANE=nc, display=ecran, dim_celula=w)
 
     # initializare tabla
-    tabla_curenta = Joc(NR_LINII=6, NR_COLOANE=7);
-    Joc.JMIN, tip_algoritm = deseneaza_alegeri(ecran, tabla_curenta)
-    print(Joc.JMIN, tip_algoritm)
+    tabla_curenta = Joc(context);
+    jucator, tip_algoritm = deseneaza_alegeri(ecran, tabla_curenta)
+    print(jucator, tip_algoritm)
 
-    Joc.JMAX = '0' if Joc.JMIN == 'x' else 'x'
+    context.seteaza_jucator(jucator)
 
     print("Tabla initiala")
     print(str(tabla_curenta))
@@ -465,7 +514,7 @@ def main():
     tabla_curenta.deseneaza_grid()
     while True:
 
-        if (stare_curenta.j_curent == Joc.JMIN):
+        if (stare_curenta.j_curent == context.JMIN):
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -475,27 +524,27 @@ def main():
                 if event.type == pygame.MOUSEMOTION:
 
                     pos = pygame.mouse.get_pos()  # coordonatele cursorului
-                    for np in range(len(Joc.celuleGrid)):
-                        if Joc.celuleGrid[np].collidepoint(pos):
-                            stare_curenta.tabla_joc.deseneaza_grid(coloana_marcaj=np % Joc.NR_COLOANE)
+                    for np in range(len(context.celuleGrid)):
+                        if context.celuleGrid[np].collidepoint(pos):
+                            stare_curenta.tabla_joc.deseneaza_grid(coloana_marcaj=np % context.NR_COLOANE)
                             break
 
                 elif event.type == pygame.MOUSEBUTTONDOWN:
 
                     pos = pygame.mouse.get_pos()  # coordonatele cursorului la momentul clickului
 
-                    for np in range(len(Joc.celuleGrid)):
+                    for np in range(len(context.celuleGrid)):
 
-                        if Joc.celuleGrid[np].collidepoint(pos):
-                            # linie=np//Joc.NR_COLOANE
-                            coloana = np % Joc.NR_COLOANE
+                        if context.celuleGrid[np].collidepoint(pos):
+                            # linie=np//context.NR_COLOANE
+                            coloana = np % context.NR_COLOANE
                             ###############################
 
                             if stare_curenta.tabla_joc.matr[0][coloana] == Joc.GOL:
                                 niv = 0
                                 while True:
-                                    if niv == Joc.NR_LINII or stare_curenta.tabla_joc.matr[niv][coloana] != Joc.GOL:
-                                        stare_curenta.tabla_joc.matr[niv - 1][coloana] = Joc.JMIN
+                                    if niv == context.NR_LINII or stare_curenta.tabla_joc.matr[niv][coloana] != Joc.GOL:
+                                        stare_curenta.tabla_joc.matr[niv - 1][coloana] = context.JMIN
                                         stare_curenta.tabla_joc.ultima_mutare = (niv - 1, coloana)
                                         break
                                     niv += 1
@@ -523,6 +572,8 @@ def main():
             t_inainte = int(round(time.time() * 1000))
             if tip_algoritm == 'minimax':
                 stare_actualizata = min_max(stare_curenta)
+            elif tip_algoritm == 'perfect':
+                stare_actualizata = perfect(stare_curenta)
             else:  # tip_algoritm=="alphabeta"
                 stare_actualizata = alpha_beta(-500, 500, stare_curenta)
             stare_curenta.tabla_joc = stare_actualizata.stare_aleasa.tabla_joc